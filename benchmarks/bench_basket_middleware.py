@@ -0,0 +1,103 @@
+"""Queries per request across the booktime pages, for a visitor with a
+basket in their session, before and after making the basket lazy."""
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import Timer, report, test_database
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from booktime import models
+
+LAZY = 'booktime.middlewares.basket_middleware'
+EAGER = 'benchmarks.bench_basket_middleware.eager_basket_middleware'
+
+
+def eager_basket_middleware(get_response):
+    # The original implementation: one query per request, always.
+    def middleware(request):
+        if 'basket_id' in request.session:
+            basket_id = request.session['basket_id']
+            basket = models.Basket.objects.get(id=basket_id)
+            request.basket = basket
+        else:
+            request.basket = None
+        response = get_response(request)
+        return response
+    return middleware
+
+
+def eager_count(basket):
+    return sum(i.quantity for i in basket.basketline_set.all())
+
+
+def measure(client, urls, repeat):
+    queries = {}
+    with Timer() as t:
+        for url in urls:
+            for i in range(repeat):
+                with CaptureQueriesContext(connection) as ctx:
+                    client.get(url)
+            queries[url] = len(ctx.captured_queries)
+    return queries, t.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        user = User.objects.create_user('bench@example.com', 'bench')
+        basket = models.Basket.objects.create(user=user)
+        for i in range(5):
+            product = models.Product.objects.create(
+                name='Book %d' % i, slug='book-%d' % i,
+                price=Decimal('10.00'))
+            models.BasketLine.objects.create(
+                basket=basket, product=product, quantity=i + 1)
+        urls = [reverse('booktime:' + name, kwargs=kwargs)
+                for name, kwargs in [
+                    ('home', {}), ('about_us', {}), ('contact_us', {}),
+                    ('products', {'tag': 'all'}),
+                    ('product', {'slug': 'book-0'}),
+                    ('address_list', {}), ('basket', {}),
+                    ('api-root', {}),
+                ]]
+        middleware = list(settings.MIDDLEWARE)
+        position = middleware.index(LAZY)
+
+        results = {}
+        for label, path in (('eager get()', EAGER), ('lazy + cached', LAZY)):
+            middleware[position] = path
+            with override_settings(MIDDLEWARE=middleware):
+                # A Client builds its middleware chain on first use.
+                client = Client()
+                client.force_login(user)
+                session = client.session
+                session['basket_id'] = basket.id
+                session.save()
+                if path == EAGER:
+                    count = models.Basket.count
+                    models.Basket.count = eager_count
+                try:
+                    results[label], seconds = measure(
+                        client, urls, args.repeat)
+                finally:
+                    if path == EAGER:
+                        models.Basket.count = count
+            report(label, len(urls) * args.repeat, seconds, 'requests')
+
+        print('\n{0:<40} {1:>12} {2:>14}'.format('url', 'eager get()',
+                                                 'lazy + cached'))
+        for url in urls:
+            print('{0:<40} {1:>12} {2:>14}'.format(
+                url, results['eager get()'][url],
+                results['lazy + cached'][url]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Checkouts/sec for growing baskets, per-unit create() against the
+set-based Basket.create_order()."""
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import Timer, report, test_database
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from booktime import models
+
+
+def create_order_per_unit(basket, billing_address, shipping_address):
+    # The original implementation, without the logging.
+    order = models.Order.objects.create(
+        user=basket.user,
+        billing_name=billing_address.name,
+        billing_address1=billing_address.address1,
+        billing_city=billing_address.city,
+        billing_country=billing_address.country,
+        shipping_name=shipping_address.name,
+        shipping_address1=shipping_address.address1,
+        shipping_city=shipping_address.city,
+        shipping_country=shipping_address.country,
+    )
+    for line in basket.basketline_set.all():
+        for item in range(line.quantity):
+            models.OrderLine.objects.create(order=order, product=line.product)
+    basket.status = models.Basket.SUBMITTED
+    basket.save()
+    return order
+
+
+def new_basket(user, products, units):
+    basket = models.Basket.objects.create(user=user)
+    models.BasketLine.objects.bulk_create(
+        models.BasketLine(basket=basket, product=product,
+                          quantity=units // len(products))
+        for product in products)
+    return basket
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--units', type=int, nargs='+',
+                        default=[1, 10, 50, 200])
+    parser.add_argument('--checkouts', type=int, default=20)
+    args = parser.parse_args()
+
+    with test_database():
+        user = User.objects.create_user('bench@example.com', 'bench')
+        address = models.Address.objects.create(
+            user=user, name='Bench', address1='1 Road', city='London',
+            country='uk')
+        products = [models.Product.objects.create(
+            name='Book %d' % i, price=Decimal('10.00')) for i in range(5)]
+
+        for units in args.units:
+            basket_products = products[:min(units, len(products))]
+            for label, checkout in (
+                    ('per-unit create()', create_order_per_unit),
+                    ('create_order()', models.Basket.create_order)):
+                baskets = [new_basket(user, basket_products, units)
+                           for i in range(args.checkouts)]
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    checkout(baskets.pop(), address, address)
+                with Timer() as t:
+                    for basket in baskets:
+                        checkout(basket, address, address)
+                report('%4d units, %s (%d queries)' % (
+                    units, label, len(ctx.captured_queries)),
+                    len(baskets), t.seconds, 'checkouts')
+
+
+if __name__ == '__main__':
+    main()
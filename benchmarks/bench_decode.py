@@ -0,0 +1,98 @@
+"""Time per image and peak RSS of making a thumbnail and a rendition,
+decoding the whole image first (the way it used to be done) against
+booktime.imaging's reduced decoding, for JPEGs of a few sizes.
+
+Every measurement runs in a fresh process, so its peak RSS is its own.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import warnings
+from io import BytesIO
+
+from benchmarks.utils import Timer
+from PIL import Image
+from booktime import imaging, renditions
+
+
+def full_thumbnail(data):
+    image = Image.open(BytesIO(data)).convert('RGB')
+    image.thumbnail(imaging.THUMBNAIL_SIZE, Image.ANTIALIAS)
+    output = BytesIO()
+    image.save(output, 'JPEG')
+    return output.getvalue()
+
+
+def full_rendition(data):
+    image = Image.open(BytesIO(data)).convert('RGB')
+    width = renditions.SIZES['large']
+    height = max(1, round(image.height * width / image.width))
+    output = BytesIO()
+    image.resize((width, height), Image.LANCZOS).save(
+        output, 'JPEG', quality=renditions.QUALITY)
+    return output.getvalue()
+
+
+ENGINES = {
+    'thumbnail, full decode': full_thumbnail,
+    'thumbnail, reduced decode': imaging.render_thumbnail,
+    'large rendition, full decode': full_rendition,
+    'large rendition, reduced decode':
+        lambda data: renditions.render(data, 'large', 'jpeg'),
+}
+
+
+def measure(engine, path, repeat):
+    """Seconds per image, and peak RSS of this process in MB before and
+    after making them."""
+    warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+    with open(path, 'rb') as f:
+        data = f.read()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with Timer() as t:
+        for i in range(repeat):
+            ENGINES[engine](data)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return t.seconds / repeat, before / 1024, peak / 1024
+
+
+def write_image(directory, width, height):
+    path = os.path.join(directory, '%dx%d.jpg' % (width, height))
+    noise = Image.effect_noise((width // 4, height // 4), 64)
+    Image.merge('RGB', (noise, noise.rotate(180), noise)).resize(
+        (width, height)).save(path, 'JPEG', quality=90)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', nargs='+',
+                        default=['1024x768', '4000x3000', '12000x9000'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    directory = tempfile.mkdtemp()
+    try:
+        for size in args.sizes:
+            width, height = map(int, size.split('x'))
+            # in another process too, peak RSS carries over to children
+            with context.Pool(1) as pool:
+                path = pool.apply(write_image, (directory, width, height))
+            for engine in ENGINES:
+                with context.Pool(1) as pool:
+                    seconds, before, peak = pool.apply(
+                        measure, (engine, path, args.repeat))
+                print('{0:<11} {1:<32} {2:>7.1f} ms/image, peak RSS '
+                      '{3:>5.0f} MB (+{4:.0f})'.format(
+                          size, engine, seconds * 1000, peak,
+                          peak - before))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Rows/sec through import_data for a generated supplier feed, first
+imported into an empty catalog then again unchanged."""
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from benchmarks.utils import Timer, report, test_database
+from django.core.management import call_command
+from django.test import override_settings
+
+IMAGE = 'booktime/fixtures/the-cathedral-the-bazaar.jpg'
+
+
+def write_feed(directory, rows, tags):
+    shutil.copy(IMAGE, os.path.join(directory, 'cover.jpg'))
+    path = os.path.join(directory, 'feed.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'description', 'tags', 'image_filename',
+                         'price'])
+        for i in range(rows):
+            writer.writerow(['Book %d' % i, 'Description of book %d' % i,
+                             'Tag %d|Tag %d' % (i % tags, (i + 1) % tags),
+                             'cover.jpg', '%d.99' % (i % 100)])
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = write_feed(directory, args.rows, args.tags)
+        for workers in args.workers:
+            with test_database(), \
+                    override_settings(MEDIA_ROOT=directory + '/media'):
+                with Timer() as t:
+                    call_command('import_data', path, directory,
+                                 '--workers', str(workers),
+                                 stdout=StringIO())
+                report('import_data --workers %d' % workers, args.rows,
+                       t.seconds, 'rows')
+                with Timer() as t:
+                    call_command('import_data', path, directory,
+                                 '--workers', str(workers),
+                                 stdout=StringIO())
+                report('unchanged re-import --workers %d' % workers,
+                       args.rows, t.seconds, 'rows')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Search latency: icontains LIKE scan vs the rango token index."""
+import argparse
+import random
+
+from benchmarks.utils import Timer, test_database
+from django.db.models import Q
+from rango import search
+from rango.models import Category, Page
+
+WORDS = ('python django tango flask bottle tutorial guide rocks official '
+         'learn minutes scientist think web framework template model view '
+         'query cache index search page category slug form admin test '
+         'deploy server database migration signal middleware').split()
+
+
+def populate(count, batch_size=10000):
+    categories = [Category.objects.create(name='category %d' % i)
+                  for i in range(100)]
+    rng = random.Random(0)
+    for start in range(0, count, batch_size):
+        Page.objects.bulk_create(
+            Page(category=rng.choice(categories),
+                 title=' '.join(rng.sample(WORDS, 4)) + ' %d' % i,
+                 url='http://example.com/%d' % i,
+                 views=rng.randint(0, 1000))
+            for i in range(start, min(start + batch_size, count)))
+
+
+def icontains(query):
+    # The original, unlimited query used by rango.views.search
+    return list(Page.objects.filter(Q(category__name__icontains=query) |
+                                    Q(title__icontains=query)))
+
+
+def measure(label, func, query, repeat):
+    with Timer() as t:
+        for _ in range(repeat):
+            func(query)
+    print('  {0:<20} {1:<18} {2:>10.2f} ms/query'.format(
+        label, repr(query), t.seconds / repeat * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, nargs='+',
+                        default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    queries = ['tango', 'python tutorial', 'middle', 'zzz']
+
+    for count in args.pages:
+        with test_database():
+            print('%d pages' % count)
+            with Timer() as t:
+                populate(count)
+            print('  populated in %.1fs' % t.seconds)
+            with Timer() as t:
+                search.rebuild_index()
+            print('  indexed in %.1fs' % t.seconds)
+            for query in queries:
+                measure('icontains', icontains, query, args.repeat)
+                measure('token index',
+                        lambda query: list(search.search(query)),
+                        query, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Thumbnails/sec drained by process_thumbnails for different pool sizes,
+and how long saving a ProductImage takes in the request."""
+import argparse
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+from benchmarks.utils import Timer, report, test_database
+from django.core.files.images import ImageFile
+from django.test import override_settings
+from booktime import models, thumbnails
+
+IMAGE = 'booktime/fixtures/the-cathedral-the-bazaar.jpg'
+
+
+def upload(product, count):
+    with open(IMAGE, 'rb') as f, Timer() as t:
+        for i in range(count):
+            models.ProductImage.objects.create(
+                product=product, image=ImageFile(f, name='%d.jpg' % i))
+    return t.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    media = tempfile.mkdtemp()
+    try:
+        with test_database(), override_settings(MEDIA_ROOT=media):
+            product = models.Product.objects.create(
+                name='Benchmark', price=Decimal('10.00'))
+            with override_settings(BOOKTIME_THUMBNAILS_SYNC=True):
+                report('save() with inline thumbnail', args.images,
+                       upload(product, args.images), 'uploads')
+            report('save() queueing the thumbnail', args.images,
+                   upload(product, args.images), 'uploads')
+            for workers in args.workers:
+                models.ProductImage.objects.update(
+                    thumbnail_status=models.ProductImage.THUMBNAIL_PENDING)
+                with Timer() as t:
+                    done, failed = thumbnails.process_pending(workers=workers)
+                report('process_pending(workers=%d)' % workers, done,
+                       t.seconds, 'thumbnails')
+    finally:
+        shutil.rmtree(media)
+
+
+if __name__ == '__main__':
+    main()
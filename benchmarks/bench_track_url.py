@@ -0,0 +1,77 @@
+"""Clicks/sec through rango's goto view, before and after buffering."""
+import argparse
+from contextlib import contextmanager
+
+from benchmarks.utils import Timer, report, test_database
+from django.db.models.signals import post_save, pre_save
+from django.shortcuts import redirect
+from django.test import RequestFactory
+from rango import signals
+from rango.counters import page_views
+from rango.models import Category, Page
+from rango.views import track_url
+
+# Page.save() receivers added since (search index, leaderboard, category
+# aggregates), which the original implementation didn't pay for.
+PAGE_RECEIVERS = [
+    (pre_save, signals.remember_page_aggregates),
+    (post_save, signals.index_page),
+    (post_save, signals.update_page_leaderboard),
+    (post_save, signals.update_category_aggregates),
+]
+
+
+@contextmanager
+def original_page_receivers():
+    for signal, receiver in PAGE_RECEIVERS:
+        signal.disconnect(receiver, sender=Page)
+    try:
+        yield
+    finally:
+        for signal, receiver in PAGE_RECEIVERS:
+            signal.connect(receiver, sender=Page)
+
+
+def track_url_unbuffered(request):
+    # The original read-modify-write implementation.
+    page = Page.objects.get(id=request.GET['page_id'])
+    page.views = page.views + 1
+    page.save()
+    return redirect(page.url)
+
+
+def run(view, requests):
+    with Timer() as t:
+        for request in requests:
+            view(request)
+        page_views.flush()
+    return t.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--pages', type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        cat = Category.objects.create(name='Benchmark')
+        Page.objects.bulk_create(
+            Page(category=cat, title='page %d' % i, url='http://example.com/')
+            for i in range(args.pages))
+        ids = list(Page.objects.values_list('id', flat=True))
+        factory = RequestFactory()
+        requests = [factory.get('/rango/goto/', {'page_id': ids[i % len(ids)]})
+                    for i in range(args.clicks)]
+
+        with original_page_receivers():
+            seconds = run(track_url_unbuffered, requests)
+        report('read-modify-write save()', args.clicks, seconds, 'clicks')
+        report('buffered F() updates', args.clicks,
+               run(track_url, requests), 'clicks')
+        total = sum(Page.objects.values_list('views', flat=True))
+        print('views recorded: %d of %d' % (total, 2 * args.clicks))
+
+
+if __name__ == '__main__':
+    main()
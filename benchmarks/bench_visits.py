@@ -0,0 +1,83 @@
+"""Session writes per request for rango's visit tracking, before and after."""
+import argparse
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+from benchmarks.utils import Timer, test_database
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rango.counters import daily_visits
+from rango.helper_fun import visits_counter
+
+# Simulated wall clock, advanced by --spacing seconds per request.
+clock = [time.time()]
+
+
+def now():
+    return datetime.fromtimestamp(clock[0])
+
+
+def visits_counter_per_request(request):
+    # The original implementation, without its print()
+    if 'last_visit' in request.session:
+        visits_counter = int(request.session.get('visits_counter'))
+        last_visit_cookie = request.session['last_visit']
+        last_visit_time = datetime.strptime(last_visit_cookie[:-7],
+                                            '%Y-%m-%d %H:%M:%S')
+        if (now() - last_visit_time).seconds > 0:
+            request.session['last_visit'] = str(now())
+            visits_counter += 1
+            request.session['visits_counter'] = visits_counter
+    else:
+        request.session['visits_counter'] = 1
+        request.session['last_visit'] = str(now())
+
+
+def run(counter, requests, spacing):
+    factory = RequestFactory()
+    writes = 0
+    session_key = None
+
+    def view(request):
+        counter(request)
+        return HttpResponse()
+
+    middleware = SessionMiddleware(view)
+    with Timer() as t:
+        for _ in range(requests):
+            clock[0] += spacing
+            request = factory.get('/rango/')
+            if session_key:
+                request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+            response = middleware(request)
+            writes += request.session.modified
+            morsel = response.cookies.get(settings.SESSION_COOKIE_NAME)
+            if morsel:
+                session_key = morsel.value
+    daily_visits.flush()
+    return writes, t.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--spacing', type=float, default=5.0,
+                        help='simulated seconds between two requests')
+    args = parser.parse_args()
+    fake_time = SimpleNamespace(time=lambda: clock[0])
+    with test_database(), mock.patch('rango.helper_fun.time', fake_time):
+        for label, counter in (('per-request session write', visits_counter_per_request),
+                               ('windowed visits_counter', visits_counter)):
+            writes, seconds = run(counter, args.requests, args.spacing)
+            print('{0:<30} {1:>6} session writes / {2} requests '
+                  '({3:.4f} per request, {4:.2f}s)'.format(
+                      label, writes, args.requests,
+                      writes / args.requests, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks are run from the project root as modules, e.g.::
+
+    python -m benchmarks.bench_track_url
+
+They always work against a throwaway test database.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tango_with_django.settings')
+import django
+
+django.setup()
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+
+@contextmanager
+def test_database():
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class Timer(object):
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+
+
+def report(label, count, seconds, unit='ops'):
+    print('{0:<45} {1:>12.0f} {2}/sec ({3:.3f}s)'.format(
+        label, count / seconds if seconds else float('inf'), unit, seconds))
@@ -70,9 +70,10 @@ class ProductTagAdmin(admin.ModelAdmin):
 
 
 class ProductImageAdmin(admin.ModelAdmin):
-    list_display = ('thumbnail_tag', 'product_name')
-    list_filter = ('product',)
-    readonly_fields = ('thumbnail',)
+    list_display = ('thumbnail_tag', 'product_name', 'thumbnail_status')
+    list_filter = ('product', 'thumbnail_status')
+    readonly_fields = ('thumbnail', 'thumbnail_status',
+                       'thumbnail_attempts', 'thumbnail_error')
     search_fields = ('product__name',)
 
     # this function returns HTML for the first column defined
@@ -115,7 +116,7 @@ class OrderLineInline(admin.TabularInline):
 
 
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "status", 'date_added')
+    list_display = ("id", "user", "status", "total", 'date_added')
     list_editable = ("status",)
     list_filter = ("status", "shipping_country", "date_added")
     inlines = (OrderLineInline,)
@@ -0,0 +1,111 @@
+"""Cache of the product catalog.
+
+Product id lists are cached per tag ("all" for the whole catalog), in
+blocks along with their count, and the tag sidebar as rendered HTML.
+Every entry is keyed by a version number that the signals in signals.py
+bump whenever a product, a tag, or the products' tags change, so edits
+show up on the next request.
+"""
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+from tango_with_django import caching
+from .models import ProductTag
+
+ALL = "all"
+TAGS = "tags"
+
+get_version = partial(caching.get_version, "booktime")
+bump_version = partial(caching.bump_version, "booktime")
+
+
+def bump_tags(slugs):
+    bump_version(*("tag:%s" % slug for slug in slugs))
+
+
+def timeout():
+    return getattr(settings, "BOOKTIME_CATALOG_TIMEOUT", 86400)
+
+
+# ids per cache entry, well under memcached's 1 MB item limit
+ID_BLOCK = 1000
+
+
+class ProductIds:
+    """Ids of products, the listing of tag, in order.
+
+    Works as the object list of a Paginator: the count and the ids are
+    cached in blocks of ID_BLOCK, and a page only reads the blocks it
+    covers, so the whole list is never loaded at once.
+    """
+
+    def __init__(self, tag, products):
+        name = ALL if tag == ALL else "tag:%s" % tag
+        self.key = "booktime:catalog:%s:%s" % (name, get_version(name))
+        self.products = products
+
+    def block(self, number):
+        key = "%s:%d" % (self.key, number)
+        ids = cache.get(key)
+        if ids is None:
+            start = number * ID_BLOCK
+            ids = list(
+                self.products.values_list("id", flat=True)[
+                    start:start + ID_BLOCK
+                ]
+            )
+            cache.set(key, ids, timeout())
+        return ids
+
+    def count(self):
+        key = "%s:count" % self.key
+        count = cache.get(key)
+        if count is None:
+            # A short first block is the whole list, no need to count.
+            first = self.block(0)
+            if len(first) < ID_BLOCK:
+                count = len(first)
+            else:
+                count = self.products.count()
+            cache.set(key, count, timeout())
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, step = index.indices(self.count())
+        if step != 1:
+            raise ValueError("ProductIds only takes contiguous slices")
+        if start >= stop:
+            return []
+        first = start // ID_BLOCK
+        ids = []
+        for number in range(first, (stop - 1) // ID_BLOCK + 1):
+            ids.extend(self.block(number))
+        offset = first * ID_BLOCK
+        return ids[start - offset:stop - offset]
+
+
+def tags_sidebar(active=None):
+    """The rendered tag list, with the tag whose slug is active marked"""
+    key = "booktime:sidebar:%s" % get_version(TAGS)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(
+            "tags.html", {"tags": ProductTag.objects.all()}
+        )
+        cache.set(key, html, timeout())
+    if active:
+        link = 'class="nav-link" href="%s"' % reverse(
+            "booktime:products", args=(active,)
+        )
+        html = html.replace(
+            link, link.replace("nav-link", "nav-link active"), 1
+        )
+    return mark_safe(html)
@@ -1,6 +1,9 @@
 from rest_framework import serializers, viewsets
-from booktime import models
+from booktime import models, renditions
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.templatetags.static import static
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
@@ -10,8 +13,8 @@ class OrderLineSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = models.OrderLine
-        fields = ('id', 'order', 'product', 'status')
-        read_only_fields = ('id', 'order', 'product')
+        fields = ('id', 'order', 'product', 'quantity', 'status')
+        read_only_fields = ('id', 'order', 'product', 'quantity')
 
 
 class PaidOrderLineViewSet(viewsets.ModelViewSet):
@@ -36,19 +39,64 @@ class PaidOrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
 
 
+class MyOrdersPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+def mobile_summary(lines):
+    quantities = {}
+    for line in lines:
+        name = line.product.name
+        quantities[name] = quantities.get(name, 0) + line.quantity
+    return ", ".join(
+        "%s x %s" % (quantities[name], name) for name in sorted(quantities)
+    )
+
+
 @api_view()
 @permission_classes((IsAuthenticated,))
 def my_orders(request):
+    """The user's orders with summary, price and thumbnail, in a fixed
+    number of queries per page: count, orders, lines"""
     user = request.user
-    orders = models.Order.objects.filter(user=user).order_by("-date_added")
+    first_image = models.ProductImage.objects.filter(
+        product__orderline__order=OuterRef("pk"),
+    ).order_by("product__orderline__id", "id")
+    orders = models.Order.objects.filter(user=user).annotate(
+        thumbnail=Subquery(first_image.values("thumbnail")[:1]),
+        image_id=Subquery(first_image.values("id")[:1]),
+        image_checksum=Subquery(first_image.values("checksum")[:1]),
+    ).prefetch_related(
+        Prefetch(
+            "orderline_set",
+            queryset=models.OrderLine.objects.select_related(
+                "product"
+            ).only("order", "quantity", "product__name"),
+            to_attr="mobile_lines",
+        )
+    ).order_by("-date_added", "-id")
+    paginator = MyOrdersPagination()
+    page = paginator.paginate_queryset(orders, request)
+    storage = models.ProductImage._meta.get_field("thumbnail").storage
     data = []
-    for order in orders:
+    for order in page:
+        image = None
+        if order.thumbnail:
+            image = storage.url(order.thumbnail)
+        elif order.image_id:
+            # as ProductImage.thumbnail_url does
+            image = static("images/thumbnail-pending.svg")
         data.append(
             {
                 "id": order.id,
-                "image": order.mobile_thumb_url,
-                "summary": order.summary,
-                "price": order.total_price,
+                "image": image,
+                "srcset": renditions.srcset(
+                    order.image_id, order.image_checksum
+                ) if order.image_id else None,
+                "summary": mobile_summary(order.mobile_lines),
+                "price": order.total,
             }
         )
-    return Response(data)
+    return paginator.get_paginated_response(data)
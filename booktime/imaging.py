@@ -0,0 +1,92 @@
+"""Decoding product images at no more than the resolution needed.
+
+A JPEG is decoded straight at 1/2, 1/4 or 1/8 of its size (draft mode)
+when that still leaves twice the pixels of the target size, and other
+formats are reduced by a whole factor right after decoding. Colour
+conversion happens on the downscaled image. Images over the pixel cap
+are refused before decoding, and those whose decoded pixels would need
+more than the memory cap before decoding them.
+
+Nothing here touches the models or the database, so the functions can
+run in pool workers that never call django.setup(), whatever the
+multiprocessing start method.
+"""
+from io import BytesIO
+import warnings
+from PIL import Image
+from django.conf import settings
+
+MAX_PIXELS = getattr(settings, "BOOKTIME_IMAGE_MAX_PIXELS", 150000000)
+MAX_MEMORY = getattr(
+    settings, "BOOKTIME_IMAGE_MAX_MEMORY", 256 * 1024 * 1024
+)
+
+# decode at least this many times the target size, for resampling quality
+REDUCING_GAP = 2
+
+THUMBNAIL_SIZE = (300, 300)
+
+
+class ImageTooLarge(OSError):
+    pass
+
+
+def open_image(data):
+    """The image in data, its header read but nothing decoded yet"""
+    with warnings.catch_warnings():
+        # MAX_PIXELS stands in for Pillow's own warning
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        image = Image.open(BytesIO(data))
+    if image.width * image.height > MAX_PIXELS:
+        raise ImageTooLarge(
+            "%dx%d is over %d pixels" % (image.width, image.height,
+                                         MAX_PIXELS)
+        )
+    return image
+
+
+def decode(image, size):
+    """Decode image, from open_image(), scaled down as far as it can go
+    and still cover size (width, height) with room to resample."""
+    box = (size[0] * REDUCING_GAP, size[1] * REDUCING_GAP)
+    image.draft(None, box)
+    # Pillow keeps up to 4 bytes a pixel
+    if image.width * image.height * 4 > MAX_MEMORY:
+        raise ImageTooLarge(
+            "%dx%d needs over %d bytes" % (image.width, image.height,
+                                           MAX_MEMORY)
+        )
+    image.load()
+    if image.mode in ("1", "P"):
+        # these can only be resampled with NEAREST
+        image = image.convert("RGB")
+    factor = min(image.width // box[0], image.height // box[1])
+    if factor > 1:
+        image = image.reduce(factor)
+    return image
+
+
+def render_thumbnail(data):
+    """JPEG thumbnail of the image in data, as bytes"""
+    image = decode(open_image(data), THUMBNAIL_SIZE)
+    image.thumbnail(THUMBNAIL_SIZE, Image.ANTIALIAS)
+    image = image.convert("RGB")
+    temp_thumb = BytesIO()
+    image.save(temp_thumb, "JPEG")
+    return temp_thumb.getvalue()
+
+
+def render_thumbnail_job(item):
+    """render_thumbnail() of (image_id, data), for the pool workers.
+    Returns (image_id, thumbnail, None) or (image_id, None, error)."""
+    image_id, data = item
+    try:
+        return image_id, render_thumbnail(data), None
+    except Exception as e:
+        return image_id, None, "%s: %s" % (type(e).__name__, e)
+
+
+def render_thumbnail_file(path):
+    """render_thumbnail() of the image file at path, for the pool workers"""
+    with open(path, "rb") as f:
+        return render_thumbnail(f.read())
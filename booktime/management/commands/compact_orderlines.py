@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from booktime import models
+
+
+class Command(BaseCommand):
+    help = 'Merge per-unit order lines into one line per product, status and price'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=500,
+            help="orders compacted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        orders = compacted = removed = 0
+        last_id = 0
+        while True:
+            order_ids = list(
+                models.Order.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not order_ids:
+                break
+            last_id = order_ids[-1]
+            merged, deleted = self.compact(order_ids)
+            orders += len(order_ids)
+            compacted += merged
+            removed += deleted
+        self.stdout.write(
+            "Orders processed=%d (lines compacted=%d, removed=%d)"
+            % (orders, compacted, removed)
+        )
+
+    def compact(self, order_ids):
+        # Each chunk is its own short transaction, only the lines of these
+        # orders are locked while they are merged.
+        with transaction.atomic():
+            rows = (
+                models.OrderLine.objects.select_for_update()
+                .filter(order_id__in=order_ids)
+                .order_by("id")
+                .values_list("id", "order_id", "product_id", "status",
+                             "price", "quantity")
+            )
+            keep = {}
+            merged = {}
+            duplicates = []
+            for line_id, order_id, product_id, status, price, quantity in rows:
+                key = (order_id, product_id, status, price)
+                if key in keep:
+                    keep[key].quantity += quantity
+                    merged[key] = keep[key]
+                    duplicates.append(line_id)
+                else:
+                    keep[key] = models.OrderLine(id=line_id, quantity=quantity)
+            if not duplicates:
+                return 0, 0
+            merged = list(merged.values())
+            models.OrderLine.objects.bulk_update(merged, ["quantity"])
+            models.OrderLine.objects.filter(id__in=duplicates).delete()
+            # The deletes went through the signals, the merges did not.
+            models.Order.objects.recompute_totals(order_ids)
+        return len(merged), len(duplicates)
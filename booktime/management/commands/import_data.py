@@ -1,57 +1,159 @@
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
 import csv
+import hashlib
 import os.path
-from django.core.files.images import ImageFile
+import time
+from django.core.files import File
+from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.template.defaultfilters import slugify
-from booktime import models
+from django.utils import timezone
+from booktime import catalog, imaging, models, renditions
+
+
+def file_checksum(path):
+    with open(path, "rb") as f:
+        return renditions.checksum(File(f))
+
+
+def fingerprint(row):
+    """Identifies the product data of a CSV row, the image aside"""
+    data = "\x1f".join(
+        [row["name"], row["description"], row["tags"], str(row["price"])]
+    )
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+class Feed:
+    """Rows of the CSV file f, opened in binary mode, read one at a time
+    from offset on. offset follows the end of the last row read."""
+
+    def __init__(self, f, offset=None):
+        self.f = f
+        header = f.readline()
+        self.fieldnames = next(csv.reader([header.decode("utf-8")]))
+        self.offset = offset or len(header)
+        f.seek(self.offset)
+
+    def _lines(self):
+        for line in self.f:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+    def __iter__(self):
+        # csv.reader() takes the lines one row at a time, never ahead
+        for values in csv.reader(self._lines()):
+            yield dict(zip(self.fieldnames, values))
+
+
+# seconds between progress lines, at the default verbosity
+PROGRESS_INTERVAL = 10
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return "%dh%02dm" % (hours, minutes)
+    if minutes:
+        return "%dm%02ds" % (minutes, seconds)
+    return "%ds" % seconds
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 class Command(BaseCommand):
     help = 'Import products in BookTime'
 
     def add_arguments(self, parser):
-        parser.add_argument("csvfile", type=open)
+        parser.add_argument("csvfile", type=str)
         parser.add_argument("image_basedir", type=str)
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="rows imported per transaction",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="processes making thumbnails, one per CPU by default",
+        )
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="carry on after the last chunk imported from this file",
+        )
 
     def handle(self, *args, **options):
         self.stdout.write("Importing products")
         c = Counter()
-        reader = csv.DictReader(options.pop("csvfile"))
-        for row in reader:
-            product, created = models.Product.objects.get_or_create(
-                name=row["name"], price=row["price"]
-            )
-            product.description = row["description"]
-            product.slug = slugify(row["name"])
-            for import_tag in row["tags"].split("|"):
-                tag, tag_created = models.ProductTag.objects.get_or_create(
-                    name=import_tag
-                )
-                product.tags.add(tag)
-                c["tags"] += 1
-                if tag_created:
-                    c["tags_created"] += 1
-            with open(
-                    os.path.join(
-                        options["image_basedir"],
-                        row["image_filename"],
-                    ),
-                    "rb",
-            ) as f:
-                image = models.ProductImage(
-                    product=product,
-                    image=ImageFile(
-                        f, name=row["image_filename"]
-                    ),
-                )
-                image.save()
-                c["images"] += 1
-            product.save()
-            c["products"] += 1
-            if created:
-                c["products_created"] += 1
+        self.image_basedir = options["image_basedir"]
+        self.tags = {}
+        path = options["csvfile"]
+        checksum = file_checksum(path)
+        checkpoint = None
+        if options["resume"]:
+            checkpoint = models.ImportCheckpoint.objects.filter(
+                checksum=checksum
+            ).first()
+            if checkpoint:
+                self.stdout.write("Resuming after row %d" % checkpoint.rows)
+            else:
+                self.stdout.write("No checkpoint, starting from the top")
+        rows_done = checkpoint.rows if checkpoint else 0
+        size = os.path.getsize(path)
+        workers = options["workers"]
+        pool = ProcessPoolExecutor(workers) if workers != 1 else None
+        start = last_progress = time.time()
+        try:
+            with open(path, "rb") as f:
+                feed = Feed(f, checkpoint.offset if checkpoint else None)
+                start_offset = feed.offset
+                for rows in chunked(feed, options["chunk_size"]):
+                    rows_done += len(rows)
+                    with transaction.atomic():
+                        slugs = self.import_chunk(rows, c, pool)
+                        models.ImportCheckpoint.objects.update_or_create(
+                            checksum=checksum,
+                            defaults={"offset": feed.offset,
+                                      "rows": rows_done},
+                        )
+                        # bulk_create() skips the signals that keep the
+                        # catalog cache current. Bump it chunk by chunk,
+                        # an interrupted run stays visible.
+                        transaction.on_commit(
+                            lambda slugs=slugs: self.bump_catalog(slugs)
+                        )
+                    now = time.time()
+                    if options["verbosity"] > 1 or (
+                            options["verbosity"] == 1
+                            and now - last_progress >= PROGRESS_INTERVAL):
+                        last_progress = now
+                        self.progress(
+                            c["products"], now - start,
+                            feed.offset - start_offset,
+                            size - start_offset, feed.offset / size,
+                        )
+        finally:
+            if pool:
+                pool.shutdown()
+        models.ImportCheckpoint.objects.filter(checksum=checksum).delete()
 
+        if options["verbosity"] > 0:
+            elapsed = time.time() - start
+            self.stdout.write(
+                "%d rows in %.1fs (%.0f rows/sec)"
+                % (c["products"], elapsed, c["products"] / elapsed)
+            )
         self.stdout.write(
             "Products processed=%d (created=%d)"
             % (c["products"], c["products_created"])
@@ -61,3 +163,155 @@ class Command(BaseCommand):
             % (c["tags"], c["tags_created"])
         )
         self.stdout.write("Images processed=%d" % c["images"])
+        self.stdout.write(
+            "Changes: products created=%d updated=%d unchanged=%d, "
+            "images added=%d unchanged=%d"
+            % (c["products_created"], c["products_updated"],
+               c["products_unchanged"], c["images_added"],
+               c["images_unchanged"])
+        )
+
+    def bump_catalog(self, slugs):
+        catalog.bump_version(catalog.ALL, catalog.TAGS)
+        catalog.bump_tags(slugs)
+
+    def progress(self, rows, elapsed, done, todo, fraction):
+        """rows imported in elapsed seconds, done bytes read out of todo"""
+        eta = elapsed * (todo - done) / done if done else 0
+        self.stdout.write(
+            "%d rows in %.1fs (%.0f rows/sec), %.1f%% of the file, ETA %s"
+            % (rows, elapsed, rows / elapsed, fraction * 100,
+               format_duration(eta))
+        )
+
+    def import_chunk(self, rows, c, pool):
+        for row in rows:
+            row["price"] = Decimal(row["price"])
+            row["tag_names"] = row["tags"].split("|")
+            row["fingerprint"] = fingerprint(row)
+        products, changed = self.upsert_products(rows, c)
+        self.resolve_tags(rows, c)
+        through = models.Product.tags.through
+        through.objects.bulk_create(
+            [
+                through(
+                    product_id=products[(row["name"], row["price"])].id,
+                    producttag_id=self.tags[name].id,
+                )
+                for row in rows
+                if (row["name"], row["price"]) in changed
+                for name in row["tag_names"]
+            ],
+            ignore_conflicts=True,
+        )
+        c["tags"] += sum(len(row["tag_names"]) for row in rows)
+        self.import_images(rows, products, c, pool)
+        return {
+            self.tags[name].slug for row in rows for name in row["tag_names"]
+        }
+
+    def resolve_tags(self, rows, c):
+        names = {
+            name for row in rows for name in row["tag_names"]
+        } - set(self.tags)
+        if names:
+            self.tags.update(
+                (tag.name, tag)
+                for tag in models.ProductTag.objects.filter(name__in=names)
+            )
+            missing = names - set(self.tags)
+            models.ProductTag.objects.bulk_create(
+                models.ProductTag(name=name, slug=slugify(name))
+                for name in missing
+            )
+            c["tags_created"] += len(missing)
+            if missing:
+                self.tags.update(
+                    (tag.name, tag)
+                    for tag in models.ProductTag.objects.filter(
+                        name__in=missing
+                    )
+                )
+
+    def upsert_products(self, rows, c):
+        """Create or update the products of rows, by (name, price).
+        Returns all of them, and the keys of those created or updated."""
+        products = {
+            (p.name, p.price): p
+            for p in models.Product.objects.filter(
+                name__in={row["name"] for row in rows}
+            )
+        }
+        created = {}
+        updated = {}
+        for row in rows:
+            key = (row["name"], row["price"])
+            product = products.get(key) or created.get(key)
+            if product is None:
+                product = models.Product(name=row["name"], price=row["price"])
+                created[key] = product
+            elif key not in created:
+                if product.import_fingerprint == row["fingerprint"]:
+                    continue
+                updated[key] = product
+            product.import_fingerprint = row["fingerprint"]
+            product.description = row["description"]
+            product.slug = slugify(row["name"])
+            product.date_updated = timezone.now()
+        models.Product.objects.bulk_create(created.values())
+        models.Product.objects.bulk_update(
+            updated.values(),
+            ["description", "slug", "date_updated", "import_fingerprint"],
+        )
+        c["products"] += len(rows)
+        c["products_created"] += len(created)
+        c["products_updated"] += len(updated)
+        c["products_unchanged"] += len(
+            {(row["name"], row["price"]) for row in rows}
+        ) - len(created) - len(updated)
+        if created:
+            # ids aren't set by bulk_create() on every database
+            for p in models.Product.objects.filter(
+                    name__in={name for name, price in created}
+            ):
+                if (p.name, p.price) in created:
+                    products[(p.name, p.price)] = p
+        return products, set(created) | set(updated)
+
+    def import_images(self, rows, products, c, pool):
+        """Add the rows' images their products don't have yet"""
+        known = set(
+            models.ProductImage.objects.filter(
+                product__in=[p.id for p in products.values()]
+            ).values_list("product_id", "checksum")
+        )
+        new = []
+        for row in rows:
+            path = os.path.join(self.image_basedir, row["image_filename"])
+            product = products[(row["name"], row["price"])]
+            checksum = file_checksum(path)
+            if (product.id, checksum) in known:
+                c["images_unchanged"] += 1
+                continue
+            known.add((product.id, checksum))
+            new.append((row, path, product, checksum))
+        c["images"] += len(rows)
+        paths = [path for row, path, product, checksum in new]
+        # the workers only need booktime.imaging, not the models
+        render = imaging.render_thumbnail_file
+        prepared = pool.map(render, paths) if pool else map(render, paths)
+        images = []
+        for (row, path, product, checksum), thumbnail in zip(new, prepared):
+            image = models.ProductImage(
+                product=product,
+                checksum=checksum,
+                thumbnail_status=models.ProductImage.THUMBNAIL_READY,
+            )
+            with open(path, "rb") as f:
+                image.image.save(row["image_filename"], File(f), save=False)
+            image.thumbnail.save(
+                row["image_filename"], ContentFile(thumbnail), save=False
+            )
+            images.append(image)
+        models.ProductImage.objects.bulk_create(images)
+        c["images_added"] += len(images)
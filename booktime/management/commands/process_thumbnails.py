@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from booktime import models, thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate the pending product image thumbnails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="worker processes, one per CPU by default",
+        )
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="give images that ran out of attempts another go",
+        )
+        parser.add_argument(
+            "--delete-orphans", action="store_true",
+            help="delete thumbnails and renditions that no image uses "
+                 "any more",
+        )
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            models.ProductImage.objects.filter(
+                thumbnail_status=models.ProductImage.THUMBNAIL_FAILED
+            ).update(
+                thumbnail_status=models.ProductImage.THUMBNAIL_PENDING,
+                thumbnail_attempts=0,
+            )
+        done, failed = thumbnails.process_pending(
+            workers=options["workers"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            "Thumbnails processed=%d (failed=%d)" % (done, failed)
+        )
+        if options["delete_orphans"]:
+            self.stdout.write(
+                "Orphan thumbnails deleted=%d" % thumbnails.delete_orphans()
+            )
+            self.stdout.write(
+                "Orphan renditions deleted=%d"
+                % thumbnails.delete_orphan_renditions()
+            )
@@ -1,14 +1,29 @@
+from django.utils.functional import SimpleLazyObject
 from . import models
 
 
+def get_basket(request, basket_id):
+    try:
+        return models.Basket.objects.get(id=basket_id)
+    except models.Basket.DoesNotExist:
+        # The basket went away (deleted, or an old session), forget it.
+        if request.session.get("basket_id") == basket_id:
+            del request.session["basket_id"]
+        return None
+
+
 def basket_middleware(get_response):
     def middleware(request):
         if 'basket_id' in request.session:
+            # Only hit the database if the view or template looks at it.
+            # Views may drop basket_id from the session before they look
+            # at the basket (checkout does), so bind the id now.
             basket_id = request.session['basket_id']
-            basket = models.Basket.objects.get(id=basket_id)
-            request.basket = basket
+            request.basket = SimpleLazyObject(
+                lambda: get_basket(request, basket_id)
+            )
         else:
-            request.basket=None
+            request.basket = None
         response = get_response(request)
         return response
     return middleware
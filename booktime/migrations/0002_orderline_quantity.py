@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderline',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:52
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+CANCELLED = 40
+
+
+def backfill_prices_and_totals(apps, schema_editor):
+    Order = apps.get_model('booktime', 'Order')
+    OrderLine = apps.get_model('booktime', 'OrderLine')
+    Product = apps.get_model('booktime', 'Product')
+    # Today's price is the best guess for lines sold before prices were kept.
+    OrderLine.objects.filter(price__isnull=True).update(
+        price=models.Subquery(
+            Product.objects.filter(pk=models.OuterRef('product')).values(
+                'price')[:1]))
+    amounts = OrderLine.objects.filter(order=models.OuterRef('pk')) \
+        .exclude(status=CANCELLED).order_by().values('order') \
+        .annotate(amount=models.Sum(
+            models.F('quantity') * models.F('price'),
+            output_field=models.DecimalField())) \
+        .values('amount')
+    Order.objects.update(
+        total=Coalesce(models.Subquery(amounts), models.Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0002_orderline_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderline',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_prices_and_totals, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderline',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=6),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0003_frozen_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='booktime_product_name_id'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+def mark_existing_thumbnails(apps, schema_editor):
+    ProductImage = apps.get_model('booktime', 'ProductImage')
+    # Everything saved so far had its thumbnail generated on save.
+    ProductImage.objects.exclude(thumbnail='').exclude(
+        thumbnail__isnull=True).update(thumbnail_status=20)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0004_product_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='thumbnail_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='thumbnail_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='thumbnail_status',
+            field=models.IntegerField(choices=[(10, 'Pending'), (20, 'Ready'), (30, 'Failed')], db_index=True, default=10),
+        ),
+        migrations.RunPython(mark_existing_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0005_thumbnail_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=40),
+        ),
+    ]
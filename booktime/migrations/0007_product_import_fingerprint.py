@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0006_productimage_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='import_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0007_product_import_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(max_length=40, unique=True)),
+                ('offset', models.BigIntegerField()),
+                ('rows', models.PositiveIntegerField()),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booktime', '0008_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderline',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6),
+        ),
+    ]
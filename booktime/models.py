@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
+from django.templatetags.static import static
 import logging
-from django.db.models import Count, Sum
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 
 
 class ProductTag(models.Model):
@@ -33,6 +37,10 @@ class Product(models.Model):
     in_stock = models.BooleanField(default=True)
     date_updated = models.DateTimeField(auto_now=True)
     tags = models.ManyToManyField(ProductTag, blank=True)
+    # sha1 of the CSV row this product was last imported from
+    import_fingerprint = models.CharField(
+        max_length=40, blank=True, editable=False,
+    )
 
     class ActiveManager(models.Manager):
         """return only active products"""
@@ -41,16 +49,50 @@ class Product(models.Model):
 
     objects = ActiveManager()
 
+    class Meta:
+        indexes = [
+            # Serves the keyset pagination of the product listings.
+            models.Index(
+                fields=["name", "id"], name="booktime_product_name_id"
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class ProductImage(models.Model):
+    THUMBNAIL_PENDING = 10
+    THUMBNAIL_READY = 20
+    THUMBNAIL_FAILED = 30
+    THUMBNAIL_STATUSES = (
+        (THUMBNAIL_PENDING, "Pending"),
+        (THUMBNAIL_READY, "Ready"),
+        (THUMBNAIL_FAILED, "Failed"),
+    )
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     image = models.ImageField(upload_to="product-images")
     thumbnail = models.ImageField(
         upload_to="product-thumbnails", null=True,
     )
+    # thumbnails are generated by the process_thumbnails command
+    thumbnail_status = models.IntegerField(
+        choices=THUMBNAIL_STATUSES, default=THUMBNAIL_PENDING,
+        db_index=True,
+    )
+    thumbnail_attempts = models.PositiveIntegerField(default=0)
+    thumbnail_error = models.TextField(blank=True)
+    # sha1 of the image file, see renditions.py
+    checksum = models.CharField(
+        max_length=40, blank=True, db_index=True, editable=False,
+    )
+
+    @property
+    def thumbnail_url(self):
+        """The thumbnail, or a placeholder while it's not there yet"""
+        if self.thumbnail:
+            return self.thumbnail.url
+        return static("images/thumbnail-pending.svg")
 
 
 class Address(models.Model):
@@ -99,10 +141,41 @@ class Basket(models.Model):
     status = models.IntegerField(choices=STATUSES, default=OPEN)
 
     def is_empty(self):
-        return self.basketline_set.all().count() == 0
+        return self.count() == 0
 
     def count(self):
-        return sum(i.quantity for i in self.basketline_set.all())
+        return self.summary()["count"]
+
+    def total(self):
+        return self.summary()["total"]
+
+    @staticmethod
+    def summary_cache_key(basket_id):
+        return "booktime:basket:%d" % basket_id
+
+    def summary(self):
+        """Number of items and total price, cached for a short while.
+        BasketLine changes invalidate it, see signals.py"""
+        key = self.summary_cache_key(self.id)
+        summary = cache.get(key)
+        if summary is None:
+            summary = self.basketline_set.aggregate(
+                count=Coalesce(Sum("quantity"), Value(0)),
+                total=Coalesce(
+                    Sum(F("quantity") * F("product__price")),
+                    Value(0),
+                    output_field=DecimalField(),
+                ),
+            )
+            cache.set(
+                key,
+                summary,
+                getattr(settings, "BOOKTIME_BASKET_CACHE_TIMEOUT", 60),
+            )
+        return summary
+
+    def invalidate_summary(self):
+        cache.delete(self.summary_cache_key(self.id))
 
     def create_order(self, billing_address, shipping_address):
         # if not self.user:
@@ -131,25 +204,33 @@ class Basket(models.Model):
             "shipping_city": shipping_address.city,
             "shipping_country": shipping_address.country,
         }
-        order = Order.objects.create(**order_data)
-        c = 0
-        for line in self.basketline_set.all():
-            for item in range(line.quantity):
-                order_line_data = {
-                    "order": order,
-                    "product": line.product,
-                }
-                order_line = OrderLine.objects.create(
-                    **order_line_data
+        lines = self.basketline_set.select_related("product").order_by("id")
+        with transaction.atomic():
+            # One row per product at today's price, inserted together.
+            # bulk_create() skips the OrderLine signals, so the order
+            # total is written here.
+            order_lines = [
+                OrderLine(
+                    product=line.product,
+                    quantity=line.quantity,
+                    price=line.product.price,
                 )
-                c += 1
+                for line in lines
+            ]
+            order_data["total"] = sum(
+                line.amount() for line in order_lines
+            )
+            order = Order.objects.create(**order_data)
+            for order_line in order_lines:
+                order_line.order = order
+            OrderLine.objects.bulk_create(order_lines)
+            self.status = Basket.SUBMITTED
+            self.save()
         logger.info(
             "Created order with id=%d and lines_count=%d",
             order.id,
-            c,
+            len(order_lines),
         )
-        self.status = Basket.SUBMITTED
-        self.save()
         return order
 
 
@@ -195,6 +276,41 @@ class Order(models.Model):
     shipping_country = models.CharField(max_length=3)
     date_updated = models.DateTimeField(auto_now=True)
     date_added = models.DateTimeField(auto_now_add=True)
+    # Sum of the lines' amounts, kept up to date by the OrderLine signals.
+    total = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0,
+        db_index=True, editable=False,
+    )
+
+    class OrderManager(models.Manager):
+        def recompute_totals(self, order_ids=None):
+            """Recompute total from the lines in one UPDATE."""
+            amounts = OrderLine.objects.filter(
+                order=models.OuterRef("pk")
+            ).exclude(status=OrderLine.CANCELLED).order_by().values(
+                "order"
+            ).annotate(
+                amount=Sum(
+                    F("quantity") * F("price"), output_field=DecimalField()
+                )
+            ).values("amount")
+            orders = self.all()
+            if order_ids is not None:
+                orders = orders.filter(id__in=order_ids)
+            return orders.update(
+                total=Coalesce(models.Subquery(amounts), Value(0))
+            )
+
+    objects = OrderManager()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("update_fields"):
+            # total may be stale in memory, the signals update it in place
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != "total"
+            ]
+        super().save(*args, **kwargs)
 
     @property
     def mobile_thumb_url(self):
@@ -202,13 +318,13 @@ class Order(models.Model):
         if products:
             img = products[0].productimage_set.first()
             if img:
-                return img.thumbnail.url
+                return img.thumbnail_url
 
     @property
     def summary(self):
         product_counts = self.orderline_set.values(
             "product__name"
-        ).annotate(c=Count("product__name"))
+        ).annotate(c=Sum("quantity"))
         pieces = []
         for pc in product_counts:
             pieces.append(
@@ -218,8 +334,13 @@ class Order(models.Model):
 
     @property
     def total_price(self):
-        res = self.orderline_set.aggregate(
-            total_price=Sum("product__price")
+        res = self.orderline_set.exclude(
+            status=OrderLine.CANCELLED
+        ).aggregate(
+            total_price=Sum(
+                F("quantity") * F("price"),
+                output_field=DecimalField(),
+            )
         )
         return res["total_price"]
 
@@ -240,3 +361,32 @@ class OrderLine(models.Model):
         Product, on_delete=models.PROTECT
     )
     status = models.IntegerField(choices=STATUSES, default=NEW)
+    quantity = models.PositiveIntegerField(
+        default=1, validators=[MinValueValidator(1)]
+    )
+    # unit price at the time of purchase, the product's current one when
+    # left blank
+    price = models.DecimalField(max_digits=6, decimal_places=2, blank=True)
+
+    def amount(self):
+        if self.status == OrderLine.CANCELLED:
+            return 0
+        return self.quantity * self.price
+
+    def save(self, *args, **kwargs):
+        if self.price is None:
+            self.price = self.product.price
+        super().save(*args, **kwargs)
+
+
+class ImportCheckpoint(models.Model):
+    """How far import_data got through a feed, saved with each chunk"""
+    # sha1 of the feed, a changed file doesn't resume an old checkpoint
+    checksum = models.CharField(max_length=40, unique=True)
+    # byte offset of the first row not imported yet
+    offset = models.BigIntegerField()
+    rows = models.PositiveIntegerField()
+    date_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "%s (%d rows)" % (self.checksum, self.rows)
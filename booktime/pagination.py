@@ -0,0 +1,86 @@
+import base64
+import json
+from django.db.models import Q
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+def encode_cursor(direction, product):
+    data = json.dumps([direction, product.name, product.id])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (direction, name, id) encoded in cursor, None if malformed"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, name, product_id = json.loads(data.decode())
+    except (TypeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(name, str) \
+            or not isinstance(product_id, int):
+        return None
+    return direction, name, product_id
+
+
+class CursorPage:
+    """One batch of products and the cursors of its neighbours, with
+    the bits of Django's Page that ListView relies on."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_products(products, cursor=None, per_page=4):
+    """Keyset pagination of products ordered by (name, id).
+
+    Reads at most per_page + 1 rows on either side of the position in
+    cursor, so a deep page costs the same as the first one.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if position and position[0] == PREVIOUS:
+        direction, name, product_id = position
+        batch = list(
+            products.filter(
+                Q(name__lt=name) | Q(name=name, id__lt=product_id)
+            ).order_by("-name", "-id")[:per_page + 1]
+        )
+        more_before = len(batch) > per_page
+        batch = batch[:per_page][::-1]
+        more_after = True
+    else:
+        if position:
+            direction, name, product_id = position
+            products = products.filter(
+                Q(name__gt=name) | Q(name=name, id__gt=product_id)
+            )
+        batch = list(products.order_by("name", "id")[:per_page + 1])
+        more_after = len(batch) > per_page
+        batch = batch[:per_page]
+        more_before = position is not None
+    if not batch:
+        return CursorPage([], None, None)
+    return CursorPage(
+        batch,
+        encode_cursor(NEXT, batch[-1]) if more_after else None,
+        encode_cursor(PREVIOUS, batch[0]) if more_before else None,
+    )
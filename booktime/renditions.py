@@ -0,0 +1,139 @@
+"""Resized copies of product images in a few named sizes and formats.
+
+A rendition is made the first time it is asked for, by the rendition
+view, and kept in the default storage under a name built from the
+image's content checksum, the size and the format. Identical uploads
+share renditions, and a replaced image gets new ones. The URLs of the
+renditions made are cached, so listings can link straight to the files
+without asking the storage. Renditions of checksums no image has any
+more are deleted by process_thumbnails --delete-orphans.
+"""
+import hashlib
+from io import BytesIO
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from . import imaging
+
+# name: width in pixels, the height follows the aspect ratio
+SIZES = getattr(settings, "BOOKTIME_RENDITION_SIZES", {
+    "small": 160,
+    "medium": 320,
+    "large": 640,
+    "xlarge": 1280,
+})
+
+# name: (PIL format, content type, file extension)
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+}
+
+QUALITY = getattr(settings, "BOOKTIME_RENDITION_QUALITY", 80)
+
+# in the default storage
+DIRECTORY = "renditions"
+
+
+def checksum(f):
+    """sha1 of the contents of the (Django) file f"""
+    sha1 = hashlib.sha1()
+    for chunk in f.chunks():
+        sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def rendition_name(image_checksum, size, fmt):
+    return "%s/%s/%s-%s.%s" % (
+        DIRECTORY, image_checksum[:2], image_checksum, size, FORMATS[fmt][2]
+    )
+
+
+def render(data, size, fmt):
+    """The image in data scaled down to the width of size, as fmt bytes"""
+    image = imaging.open_image(data)
+    width = SIZES[size]
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = imaging.decode(image, (width, height))
+        image = image.resize((width, height), Image.LANCZOS)
+    else:
+        image = imaging.decode(image, image.size)
+    image = image.convert("RGB")
+    output = BytesIO()
+    image.save(output, FORMATS[fmt][0], quality=QUALITY)
+    return output.getvalue()
+
+
+def ensure_checksum(image):
+    """Fill in image.checksum for images saved before it existed"""
+    if not image.checksum:
+        with image.image.open("rb") as f:
+            image.checksum = checksum(f)
+        type(image).objects.filter(pk=image.pk).update(
+            checksum=image.checksum
+        )
+    return image.checksum
+
+
+def url_cache_key(name):
+    return "booktime:rendition:%s" % name
+
+
+def url_timeout():
+    return getattr(settings, "BOOKTIME_RENDITION_URL_TIMEOUT", 86400)
+
+
+def get_rendition(image, size, fmt):
+    """Name of the stored rendition of image, made if needed"""
+    name = rendition_name(ensure_checksum(image), size, fmt)
+    if cache.get(url_cache_key(name)) is None:
+        if not default_storage.exists(name):
+            with image.image.open("rb") as f:
+                data = render(f.read(), size, fmt)
+            saved = default_storage.save(name, ContentFile(data))
+            if saved != name:
+                # Someone else made it at the same time, keep theirs.
+                default_storage.delete(saved)
+        # Listings link straight to the file from now on.
+        cache.set(url_cache_key(name), default_storage.url(name),
+                  url_timeout())
+    return name
+
+
+def rendition_url(image_id, image_checksum, size, fmt="jpeg"):
+    """URL of a rendition: the stored file if it is known to be made
+    already, otherwise the view that makes it."""
+    return srcset_urls(image_id, image_checksum, [size], fmt)[size]
+
+
+def srcset_urls(image_id, image_checksum, sizes, fmt="jpeg"):
+    """{size: rendition_url()} in a single cache lookup. The storage
+    isn't asked, which could cost a network round trip per size."""
+    urls = {}
+    if image_checksum:
+        names = {
+            size: url_cache_key(rendition_name(image_checksum, size, fmt))
+            for size in sizes
+        }
+        cached = cache.get_many(names.values())
+        urls = {
+            size: cached[key] for size, key in names.items() if key in cached
+        }
+    for size in sizes:
+        if size not in urls:
+            urls[size] = reverse(
+                "booktime:rendition",
+                kwargs={"image_id": image_id, "size": size, "fmt": fmt},
+            )
+    return urls
+
+
+def srcset(image_id, image_checksum, fmt="jpeg"):
+    """srcset attribute value with every size of the image"""
+    sizes = sorted(SIZES, key=SIZES.get)
+    urls = srcset_urls(image_id, image_checksum, sizes, fmt)
+    return ", ".join("%s %dw" % (urls[size], SIZES[size]) for size in sizes)
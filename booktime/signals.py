@@ -1,39 +1,121 @@
-from io import BytesIO
 import logging
-from PIL import Image
-from django.core.files.base import ContentFile
-from django.db.models.signals import pre_save, post_save
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    pre_save, post_save, pre_delete, post_delete, m2m_changed,
+)
 from django.dispatch import receiver
-from .models import ProductImage, Basket, OrderLine, Order
+from . import catalog, renditions, thumbnails
+from .models import (
+    Product, ProductTag, ProductImage, Basket, BasketLine, OrderLine, Order,
+)
 from django.contrib.auth.signals import user_logged_in
 from django.conf import settings
 from rest_framework.authtoken.models import Token
 
-THUMBNAIL_SIZE = (300, 300)
-
 logger = logging.getLogger(__name__)
 
 
 @receiver(pre_save, sender=ProductImage)
-def generate_thumbnail(sender, instance, **kwargs):
-    """code that generates the thumbnail"""
-    logger.info(
-        "Generating thumbnail for product %d",
-        instance.product.id,
-    )
-    image = Image.open(instance.image)
-    image = image.convert("RGB")
-    image.thumbnail(THUMBNAIL_SIZE, Image.ANTIALIAS)
-    temp_thumb = BytesIO()
-    image.save(temp_thumb, "JPEG")
-    temp_thumb.seek(0)
-    # set save=False, otherwise it will run in an infinite loop
-    instance.thumbnail.save(
-        instance.image.name,
-        ContentFile(temp_thumb.read()),
-        save=False,
-    )
-    temp_thumb.close()
+def generate_thumbnail(sender, instance, raw=False, **kwargs):
+    """queue a new thumbnail when the image is new or replaced"""
+    if raw:
+        return
+    old = None
+    if not instance._state.adding:
+        old = ProductImage.objects.filter(pk=instance.pk).values(
+            "image", "checksum", "thumbnail", "thumbnail_status"
+        ).first()
+        if old is not None and old["image"] == instance.image.name:
+            return
+    instance.checksum = renditions.checksum(instance.image)
+    if old is not None and old["thumbnail"]:
+        if old["checksum"] == instance.checksum \
+                and old["thumbnail_status"] == ProductImage.THUMBNAIL_READY:
+            # the same picture uploaded again, its thumbnail still fits
+            instance.thumbnail = old["thumbnail"]
+            instance.thumbnail_status = ProductImage.THUMBNAIL_READY
+            return
+        # deleted by delete_stale_thumbnail() once the save is committed
+        instance._stale_thumbnail = old["thumbnail"]
+    instance.thumbnail = None
+    instance.thumbnail_attempts = 0
+    instance.thumbnail_error = ""
+    if getattr(settings, "BOOKTIME_THUMBNAILS_SYNC", False):
+        logger.info(
+            "Generating thumbnail for product %d",
+            instance.product.id,
+        )
+        thumbnails.generate_thumbnail(instance)
+    else:
+        logger.info(
+            "Queued thumbnail for product %d",
+            instance.product.id,
+        )
+        instance.thumbnail_status = ProductImage.THUMBNAIL_PENDING
+
+
+@receiver(post_save, sender=ProductImage)
+def delete_stale_thumbnail(sender, instance, raw=False, **kwargs):
+    name = instance.__dict__.pop("_stale_thumbnail", None)
+    if name:
+        transaction.on_commit(lambda: thumbnails.delete_unused(name))
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_thumbnail(sender, instance, **kwargs):
+    name = instance.thumbnail.name
+    if name:
+        transaction.on_commit(lambda: thumbnails.delete_unused(name))
+
+
+@receiver(post_save, sender=Product)
+def product_to_catalog(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    catalog.bump_version(catalog.ALL)
+    catalog.bump_tags(instance.tags.values_list("slug", flat=True))
+
+
+@receiver(pre_delete, sender=Product)
+def product_delete_to_catalog(sender, instance, **kwargs):
+    # the tag links are gone by post_delete
+    catalog.bump_version(catalog.ALL)
+    catalog.bump_tags(instance.tags.values_list("slug", flat=True))
+
+
+@receiver(pre_save, sender=ProductTag)
+def producttag_slug_to_catalog(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        old = ProductTag.objects.filter(pk=instance.pk).first()
+        if old is not None and old.slug != instance.slug:
+            catalog.bump_tags([old.slug])
+
+
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+def producttag_to_catalog(sender, instance, **kwargs):
+    catalog.bump_version(catalog.TAGS)
+    catalog.bump_tags([instance.slug])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_to_catalog(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # instance is a tag, the product lists of other tags don't change
+        catalog.bump_tags([instance.slug])
+    elif action == "pre_clear":
+        catalog.bump_tags(instance.tags.values_list("slug", flat=True))
+    else:
+        catalog.bump_tags(
+            ProductTag.objects.filter(pk__in=pk_set).values_list(
+                "slug", flat=True
+            )
+        )
 
 
 @receiver(user_logged_in)
@@ -61,6 +143,49 @@ def merge_baskets_if_found(sender, user, request, **kwargs):
     #         )
 
 
+@receiver(post_save, sender=Basket)
+def basket_to_summary_cache(sender, instance, **kwargs):
+    instance.invalidate_summary()
+
+
+@receiver(post_save, sender=BasketLine)
+@receiver(post_delete, sender=BasketLine)
+def basketline_to_summary_cache(sender, instance, **kwargs):
+    cache.delete(Basket.summary_cache_key(instance.basket_id))
+
+
+def adjust_order_total(order_id, delta):
+    if delta:
+        Order.objects.filter(pk=order_id).update(total=F("total") + delta)
+
+
+@receiver(pre_save, sender=OrderLine)
+def remember_orderline_amount(sender, instance, raw=False, **kwargs):
+    instance._old_amount = None
+    if instance.pk and not raw:
+        old = OrderLine.objects.filter(pk=instance.pk).first()
+        if old is not None:
+            instance._old_amount = (old.order_id, old.amount())
+
+
+@receiver(post_save, sender=OrderLine)
+def orderline_to_order_total(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, "_old_amount", None)
+    if old is not None and old[0] != instance.order_id:
+        adjust_order_total(old[0], -old[1])
+        old = None
+    adjust_order_total(
+        instance.order_id, instance.amount() - (old[1] if old else 0)
+    )
+
+
+@receiver(post_delete, sender=OrderLine)
+def orderline_delete_to_order_total(sender, instance, **kwargs):
+    adjust_order_total(instance.order_id, -instance.amount())
+
+
 @receiver(post_save, sender=OrderLine)
 def orderline_to_order_status(sender, instance, **kwargs):
     if not instance.order.orderline_set.filter(status__lt=OrderLine.SENT).exists():
@@ -1,9 +1,14 @@
 from django import template
-from booktime.models import ProductTag
+from booktime import catalog, renditions
 
 register = template.Library()
 
 
-@register.inclusion_tag('tags.html')
+@register.simple_tag
 def get_tags_list(tag=None):
-    return {'tags': ProductTag.objects.all(), 'act_tag': tag}
\ No newline at end of file
+    return catalog.tags_sidebar(tag)
+
+
+@register.simple_tag
+def srcset(image, fmt="jpeg"):
+    return renditions.srcset(image.id, image.checksum, fmt)
@@ -0,0 +1,95 @@
+from decimal import Decimal
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from booktime import catalog, models
+
+
+class TestCatalog(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tag = models.ProductTag.objects.create(
+            name="Open source", slug="opensource"
+        )
+        self.product = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            slug="cathedral-bazaar",
+            price=Decimal("10.00"),
+        )
+        self.product.tags.add(self.tag)
+
+    def listing(self, tag):
+        response = self.client.get(
+            reverse("booktime:products", kwargs={"tag": tag})
+        )
+        return [p.name for p in response.context["object_list"]]
+
+    def test_product_edits_show_up_immediately(self):
+        self.assertEqual(
+            self.listing("opensource"), ["The cathedral and the bazaar"]
+        )
+        self.assertEqual(self.listing("all"), ["The cathedral and the bazaar"])
+        other = models.Product.objects.create(
+            name="A Tale of Two Cities", slug="tale", price=Decimal("2.00")
+        )
+        self.assertEqual(
+            self.listing("all"),
+            ["A Tale of Two Cities", "The cathedral and the bazaar"],
+        )
+        other.tags.add(self.tag)
+        self.assertEqual(len(self.listing("opensource")), 2)
+        self.tag.product_set.remove(other)
+        self.assertEqual(len(self.listing("opensource")), 1)
+        self.product.active = False
+        self.product.save()
+        self.assertEqual(self.listing("opensource"), [])
+        other.delete()
+        self.assertEqual(self.listing("all"), [])
+
+    def test_clearing_tags(self):
+        self.assertEqual(len(self.listing("opensource")), 1)
+        self.product.tags.clear()
+        self.assertEqual(self.listing("opensource"), [])
+
+    def test_tag_edits_show_up_in_the_sidebar(self):
+        html = catalog.tags_sidebar("opensource")
+        self.assertIn('class="nav-link active"', html)
+        with self.assertNumQueries(0):
+            catalog.tags_sidebar()
+        self.assertNotIn("active", catalog.tags_sidebar())
+        self.tag.name = "Free software"
+        self.tag.slug = "free"
+        self.tag.save()
+        html = catalog.tags_sidebar()
+        self.assertIn("Free software", html)
+        self.assertNotIn("Open source", html)
+        self.assertEqual(len(self.listing("free")), 1)
+
+    def test_ids_are_cached_in_blocks(self):
+        for i in range(5):
+            models.Product.objects.create(
+                name="Book %d" % i, slug="book-%d" % i, price=Decimal("1.00")
+            )
+        with patch.object(catalog, "ID_BLOCK", 2):
+            ids = catalog.ProductIds("all", models.Product.objects.active()
+                                     .order_by("name", "id"))
+            self.assertEqual(ids.count(), 6)
+            self.assertEqual(
+                ids[1:5],
+                list(models.Product.objects.order_by("name", "id")
+                     .values_list("id", flat=True)[1:5]),
+            )
+            self.assertEqual(len(cache.get(ids.key + ":0")), 2)
+            self.assertIsNone(cache.get(ids.key + ":3"))
+            with self.assertNumQueries(0):
+                ids.count()
+                ids[2:4]
+            response = self.client.get(
+                reverse("booktime:products", kwargs={"tag": "all"}),
+                {"page": 2},
+            )
+        self.assertEqual(
+            [p.name for p in response.context["object_list"]],
+            ["Book 4", "The cathedral and the bazaar"],
+        )
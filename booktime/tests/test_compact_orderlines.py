@@ -0,0 +1,62 @@
+from io import StringIO
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from booktime import models
+
+
+class TestCompactOrderLines(TestCase):
+    def test_per_unit_lines_are_merged(self):
+        user1 = models.User.objects.create_user(
+            "user1", "pw432joij"
+        )
+        p1 = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        p2 = models.Product.objects.create(
+            name="Pride and Prejudice", price=Decimal("2.00")
+        )
+        orders = [models.Order.objects.create(user=user1) for i in range(3)]
+        for order in orders:
+            for i in range(3):
+                models.OrderLine.objects.create(order=order, product=p1)
+            models.OrderLine.objects.create(order=order, product=p2)
+        sent = models.OrderLine.objects.create(
+            order=orders[0], product=p1, status=models.OrderLine.SENT
+        )
+        summaries = [(o.summary, o.total_price) for o in orders]
+        totals = list(models.Order.objects.order_by("id").values_list(
+            "total", flat=True
+        ))
+
+        out = StringIO()
+        call_command("compact_orderlines", "--chunk-size", "2", stdout=out)
+
+        self.assertEqual(
+            out.getvalue(),
+            "Orders processed=3 (lines compacted=3, removed=6)\n",
+        )
+        self.assertEqual(
+            [(o.summary, o.total_price) for o in orders], summaries
+        )
+        self.assertEqual(
+            list(
+                orders[0].orderline_set.order_by("id").values_list(
+                    "product", "status", "quantity"
+                )
+            ),
+            [
+                (p1.id, models.OrderLine.NEW, 3),
+                (p2.id, models.OrderLine.NEW, 1),
+                (p1.id, models.OrderLine.SENT, 1),
+            ],
+        )
+        self.assertEqual(
+            list(models.Order.objects.order_by("id").values_list(
+                "total", flat=True
+            )),
+            totals,
+        )
+        sent.refresh_from_db()
+        self.assertEqual(sent.quantity, 1)
@@ -47,14 +47,75 @@ class TestEndpoints(APITestCase):
             {
                 "id": orders[1].id,
                 "image": None,
+                "srcset": None,
                 "price": 28.0,
                 "summary": "2 x The B Book",
             },
             {
                 "id": orders[0].id,
                 "image": None,
+                "srcset": None,
                 "price": 24.0,
                 "summary": "2 x The book of A",
             },
         ]
-        self.assertEqual(response.json(), expected)
+        self.assertEqual(response.json()["results"], expected)
+
+    def test_my_orders_query_count_is_constant(self):
+        user = models.User.objects.create_user("user1", "abcabcabc")
+        self.client.force_authenticate(user)
+        a = factories.ProductFactory(name="The book of A", price=12.00)
+        b = factories.ProductFactory(name="The B Book", price=14.00)
+        # bulk_create() skips the thumbnail signal
+        models.ProductImage.objects.bulk_create([
+            models.ProductImage(
+                product=b, image="b.jpg", thumbnail="b.thumb.jpg"
+            )
+        ])
+        url = reverse("booktime:mobile_my_orders")
+
+        def add_orders(count):
+            for order in factories.OrderFactory.create_batch(
+                count, user=user
+            ):
+                factories.OrderLineFactory(
+                    order=order, product=a, quantity=2
+                )
+                factories.OrderLineFactory(order=order, product=b)
+
+        add_orders(2)
+        # count, orders, lines; force_authenticate() costs nothing
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["count"], 2)
+        add_orders(30)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data["count"], 32)
+        self.assertEqual(len(data["results"]), 20)
+        self.assertEqual(
+            data["results"][0]["summary"],
+            "1 x The B Book, 2 x The book of A",
+        )
+        self.assertEqual(data["results"][0]["price"], 38.0)
+        self.assertTrue(
+            data["results"][0]["image"].endswith("b.thumb.jpg")
+        )
+        self.assertIn(" 160w, ", data["results"][0]["srcset"])
+
+    def test_my_orders_show_pending_thumbnails(self):
+        user = models.User.objects.create_user("user1", "abcabcabc")
+        self.client.force_authenticate(user)
+        product = factories.ProductFactory(name="The book of A")
+        # bulk_create() skips the thumbnail signal
+        models.ProductImage.objects.bulk_create([
+            models.ProductImage(product=product, image="a.jpg")
+        ])
+        factories.OrderLineFactory(
+            order=factories.OrderFactory(user=user), product=product
+        )
+        response = self.client.get(reverse("booktime:mobile_my_orders"))
+        result = response.json()["results"][0]
+        self.assertTrue(result["image"].endswith("thumbnail-pending.svg"))
+        self.assertIn(" 160w, ", result["srcset"])
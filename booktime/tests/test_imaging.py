@@ -0,0 +1,55 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import multiprocessing
+from unittest.mock import patch
+from PIL import Image
+from django.test import SimpleTestCase
+from booktime import imaging, renditions
+
+
+def image_data(size, fmt="JPEG", mode="RGB"):
+    output = BytesIO()
+    Image.new(mode, size, "white").save(output, fmt)
+    return output.getvalue()
+
+
+class TestImaging(SimpleTestCase):
+    def test_jpeg_is_decoded_in_draft_mode(self):
+        image = imaging.open_image(image_data((4000, 3000)))
+        image = imaging.decode(image, (300, 300))
+        self.assertEqual(image.size, (1000, 750))
+
+    def test_other_formats_are_reduced_after_decoding(self):
+        image = imaging.open_image(image_data((4000, 3000), "PNG", "P"))
+        image = imaging.decode(image, (300, 300))
+        self.assertEqual(image.mode, "RGB")
+        self.assertEqual(image.size, (800, 600))
+
+    def test_outputs_keep_their_sizes(self):
+        data = image_data((4000, 3000))
+        thumbnail = Image.open(BytesIO(imaging.render_thumbnail(data)))
+        self.assertEqual(thumbnail.size, (300, 225))
+        rendition = Image.open(BytesIO(renditions.render(data, "small",
+                                                         "webp")))
+        self.assertEqual(rendition.size, (160, 120))
+
+    def test_images_over_the_caps_are_refused(self):
+        with patch.object(imaging, "MAX_PIXELS", 999999):
+            with self.assertRaises(imaging.ImageTooLarge):
+                imaging.open_image(image_data((1000, 1000), "PNG"))
+        with patch.object(imaging, "MAX_MEMORY", 5000000):
+            with self.assertRaises(imaging.ImageTooLarge):
+                imaging.render_thumbnail(image_data((2000, 2000), "PNG"))
+            # decoded at half the size, under the cap
+            imaging.render_thumbnail(image_data((2000, 2000)))
+
+    def test_thumbnails_render_in_spawned_workers(self):
+        # Workers started with spawn (macOS, and the default in newer
+        # Pythons) never run django.setup().
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            image_id, thumbnail, error = pool.submit(
+                imaging.render_thumbnail_job, (1, image_data((600, 450)))
+            ).result()
+        self.assertIsNone(error)
+        self.assertEqual(Image.open(BytesIO(thumbnail)).size, (300, 225))
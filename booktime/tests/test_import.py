@@ -1,9 +1,12 @@
 from io import StringIO
+import os.path
 import tempfile
+from unittest.mock import patch
 from django.conf import settings
 from django.core.management import call_command
-from django.test import TestCase, override_settings
-from booktime import models
+from django.test import TestCase, TransactionTestCase, override_settings
+from booktime import catalog, models
+from booktime.management.commands import import_data
 
 
 class TestImport(TestCase):
@@ -14,11 +17,128 @@ class TestImport(TestCase):
         args = ['booktime/fixtures/product-sample.csv',
                 'booktime/fixtures/product-sampleimages/']
         call_command('import_data', *args, stdout=out)
-        expected_out = ("Importing products\n"
-                        "Products processed=3 (created=3)\n"
-                        "Tags processed=6 (created=6)\n"
-                        "Images processed=3\n")
-        self.assertEqual(out.getvalue(), expected_out)
+        lines = out.getvalue().splitlines()
+        self.assertRegex(
+            lines.pop(1), r"^3 rows in [\d.]+s \(\d+ rows/sec\)$"
+        )
+        expected_out = ["Importing products",
+                        "Products processed=3 (created=3)",
+                        "Tags processed=6 (created=6)",
+                        "Images processed=3",
+                        "Changes: products created=3 updated=0 "
+                        "unchanged=0, images added=3 unchanged=0"]
+        self.assertEqual(lines, expected_out)
         self.assertEqual(models.Product.objects.count(), 3)
         self.assertEqual(models.ProductTag.objects.count(), 6)
         self.assertEqual(models.ProductImage.objects.count(), 3)
+
+    @override_settings(MEDIA_ROOT=tempfile.gettempdir())
+    def test_import_data_links_tags_and_thumbnails(self):
+        out = StringIO()
+        args = ['booktime/fixtures/product-sample.csv',
+                'booktime/fixtures/product-sampleimages/',
+                '--chunk-size', '2', '--workers', '1', '--verbosity', '2']
+        call_command('import_data', *args, stdout=out)
+        self.assertIn("3 rows in", out.getvalue())
+        self.assertIn("100.0% of the file, ETA 0s", out.getvalue())
+        product = models.Product.objects.get(name="Siddhartha")
+        self.assertEqual(product.slug, "siddhartha")
+        self.assertEqual(
+            sorted(product.tags.values_list("name", "slug")),
+            [("Narrative", "narrative"), ("Religion", "religion")],
+        )
+        image = product.productimage_set.get()
+        self.assertEqual(
+            image.thumbnail_status, models.ProductImage.THUMBNAIL_READY
+        )
+        self.assertEqual(len(image.checksum), 40)
+        self.assertTrue(image.thumbnail)
+
+        call_command('import_data', *args[:2], stdout=StringIO())
+        self.assertEqual(models.Product.objects.count(), 3)
+        self.assertEqual(models.ProductTag.objects.count(), 6)
+        self.assertEqual(product.tags.count(), 2)
+
+    @override_settings(MEDIA_ROOT=tempfile.gettempdir())
+    def test_import_data_skips_unchanged_rows(self):
+        args = ['booktime/fixtures/product-sample.csv',
+                'booktime/fixtures/product-sampleimages/']
+        call_command('import_data', *args, stdout=StringIO())
+        product = models.Product.objects.get(name="Siddhartha")
+
+        out = StringIO()
+        call_command('import_data', *args, '--verbosity', '0', stdout=out)
+        self.assertNotIn("rows in", out.getvalue())
+        self.assertIn(
+            "Changes: products created=0 updated=0 unchanged=3, "
+            "images added=0 unchanged=3",
+            out.getvalue(),
+        )
+        self.assertEqual(models.ProductImage.objects.count(), 3)
+        product_after = models.Product.objects.get(pk=product.pk)
+        self.assertEqual(product_after.date_updated, product.date_updated)
+
+        with open(args[0]) as f:
+            feed = f.read().replace("Siddhartha,", "Siddhartha,Updated. ", 1)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as changed:
+            changed.write(feed)
+            changed.flush()
+            out = StringIO()
+            call_command(
+                'import_data', changed.name, os.path.abspath(args[1]),
+                stdout=out,
+            )
+        self.assertIn(
+            "Changes: products created=0 updated=1 unchanged=2, "
+            "images added=0 unchanged=3",
+            out.getvalue(),
+        )
+        product.refresh_from_db()
+        self.assertTrue(product.description.startswith("Updated. "))
+
+    @override_settings(MEDIA_ROOT=tempfile.gettempdir())
+    def test_import_data_resumes_after_last_chunk(self):
+        args = ['booktime/fixtures/product-sample.csv',
+                'booktime/fixtures/product-sampleimages/',
+                '--chunk-size', '2', '--workers', '1']
+        import_images = import_data.Command.import_images
+        calls = []
+
+        def fail_second_chunk(self, rows, *args):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError("interrupted")
+            return import_images(self, rows, *args)
+
+        with patch.object(
+                import_data.Command, "import_images", fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command('import_data', *args, stdout=StringIO())
+        self.assertEqual(models.Product.objects.count(), 2)
+        checkpoint = models.ImportCheckpoint.objects.get()
+        self.assertEqual(checkpoint.rows, 2)
+
+        out = StringIO()
+        call_command('import_data', *args, '--resume', stdout=out)
+        self.assertIn("Resuming after row 2", out.getvalue())
+        self.assertIn("Products processed=1 (created=1)", out.getvalue())
+        self.assertEqual(models.Product.objects.count(), 3)
+        self.assertEqual(models.ProductImage.objects.count(), 3)
+        self.assertFalse(models.ImportCheckpoint.objects.exists())
+
+
+class TestInterruptedImport(TransactionTestCase):
+    # not TestCase: the catalog is bumped as each chunk commits
+
+    @override_settings(MEDIA_ROOT=tempfile.gettempdir())
+    def test_committed_chunks_show_in_the_catalog(self):
+        args = ['booktime/fixtures/product-sample.csv',
+                'booktime/fixtures/product-sampleimages/',
+                '--chunk-size', '2', '--workers', '1']
+        version = catalog.get_version(catalog.ALL)
+        with patch.object(import_data.Command, "import_images",
+                          side_effect=[None, RuntimeError("interrupted")]):
+            with self.assertRaises(RuntimeError):
+                call_command('import_data', *args, stdout=StringIO())
+        self.assertEqual(models.Product.objects.count(), 2)
+        self.assertGreater(catalog.get_version(catalog.ALL), version)
@@ -0,0 +1,62 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+from booktime import models
+from booktime.middlewares import basket_middleware
+
+
+class TestBasketMiddleware(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("user1", "pw432joij")
+        self.basket = models.Basket.objects.create(user=self.user)
+        self.product = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            slug="cathedral-bazaar",
+            price=Decimal("10.00"),
+        )
+
+    def process(self, basket_id):
+        request = RequestFactory().get("/")
+        request.session = {}
+        if basket_id is not None:
+            request.session["basket_id"] = basket_id
+        basket_middleware(lambda request: None)(request)
+        return request
+
+    def test_basket_is_loaded_on_first_access(self):
+        with self.assertNumQueries(0):
+            request = self.process(self.basket.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.basket.id, self.basket.id)
+            self.assertEqual(request.basket.user_id, self.user.id)
+
+    def test_no_basket(self):
+        request = self.process(None)
+        self.assertIsNone(request.basket)
+
+    def test_stale_basket_id_is_forgotten(self):
+        request = self.process(self.basket.id + 1)
+        self.assertFalse(request.basket)
+        self.assertNotIn("basket_id", request.session)
+
+    def test_summary_is_cached_until_lines_change(self):
+        line = models.BasketLine.objects.create(
+            basket=self.basket, product=self.product, quantity=2
+        )
+        self.assertEqual(self.basket.count(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.basket.count(), 2)
+            self.assertEqual(self.basket.total(), Decimal("20.00"))
+        line.quantity = 3
+        line.save()
+        self.assertEqual(self.basket.total(), Decimal("30.00"))
+        line.delete()
+        self.assertTrue(self.basket.is_empty())
+        self.assertEqual(self.basket.total(), 0)
+
+    def test_basket_id_is_bound_when_the_request_starts(self):
+        request = self.process(self.basket.id)
+        del request.session["basket_id"]
+        self.assertEqual(request.basket.id, self.basket.id)
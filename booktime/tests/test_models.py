@@ -52,3 +52,112 @@ class TestModel(TestCase):
         lines = order.orderline_set.all()
         self.assertEquals(lines[0].product, p1)
         self.assertEquals(lines[1].product, p2)
+
+    def test_create_order_is_set_based(self):
+        p1 = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        p2 = models.Product.objects.create(
+            name="Pride and Prejudice", price=Decimal("2.00")
+        )
+        user1 = models.User.objects.create_user(
+            "user1", "pw432joij"
+        )
+        address = models.Address.objects.create(
+            user=user1,
+            name="John Kimball",
+            address1="127 Strudel road",
+            city="London",
+            country="uk",
+        )
+        basket = models.Basket.objects.create(user=user1)
+        models.BasketLine.objects.create(
+            basket=basket, product=p1, quantity=50
+        )
+        models.BasketLine.objects.create(
+            basket=basket, product=p2, quantity=2
+        )
+        # savepoint, order, lines, one bulk insert, basket, release
+        with self.assertNumQueries(6):
+            order = basket.create_order(address, address)
+        self.assertEquals(
+            list(order.orderline_set.values_list("product", "quantity")),
+            [(p1.id, 50), (p2.id, 2)],
+        )
+        basket.refresh_from_db()
+        self.assertEquals(basket.status, models.Basket.SUBMITTED)
+
+    def test_order_aggregates_use_quantity(self):
+        user1 = models.User.objects.create_user(
+            "user1", "pw432joij"
+        )
+        p1 = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        p2 = models.Product.objects.create(
+            name="Pride and Prejudice", price=Decimal("2.00")
+        )
+        order = models.Order.objects.create(user=user1)
+        models.OrderLine.objects.create(order=order, product=p1, quantity=3)
+        # an old style per-unit line
+        models.OrderLine.objects.create(order=order, product=p2)
+        models.OrderLine.objects.create(order=order, product=p2)
+        self.assertEquals(
+            order.summary,
+            "2 x Pride and Prejudice, 3 x The cathedral and the bazaar",
+        )
+        self.assertEquals(order.total_price, Decimal("34.00"))
+
+    def test_order_total_is_frozen_and_maintained(self):
+        user1 = models.User.objects.create_user(
+            "user1", "pw432joij"
+        )
+        address = models.Address.objects.create(
+            user=user1,
+            name="John Kimball",
+            address1="127 Strudel road",
+            city="London",
+            country="uk",
+        )
+        p1 = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        p2 = models.Product.objects.create(
+            name="Pride and Prejudice", price=Decimal("2.00")
+        )
+        basket = models.Basket.objects.create(user=user1)
+        models.BasketLine.objects.create(
+            basket=basket, product=p1, quantity=3
+        )
+        models.BasketLine.objects.create(
+            basket=basket, product=p2, quantity=1
+        )
+        order = basket.create_order(address, address)
+        self.assertEquals(order.total, Decimal("32.00"))
+
+        p1.price = Decimal("99.00")
+        p1.save()
+        order.refresh_from_db()
+        self.assertEquals(order.total, Decimal("32.00"))
+        self.assertEquals(order.total_price, Decimal("32.00"))
+
+        line = order.orderline_set.get(product=p1)
+        line.status = models.OrderLine.CANCELLED
+        line.save()
+        order.status = models.Order.PAID
+        order.save()
+        order.refresh_from_db()
+        self.assertEquals(order.total, Decimal("2.00"))
+
+        # as the admin inline adds it, with the price left blank
+        line = models.OrderLine(order=order, product=p1)
+        line.full_clean()
+        line.save()
+        self.assertEquals(line.price, Decimal("99.00"))
+        order.orderline_set.get(product=p2).delete()
+        order.refresh_from_db()
+        self.assertEquals(order.total, Decimal("99.00"))
+        self.assertEquals(order.total, order.total_price)
@@ -0,0 +1,117 @@
+from decimal import Decimal
+from io import BytesIO, StringIO
+import shutil
+import tempfile
+from unittest.mock import patch
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.images import ImageFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from booktime import models, renditions
+
+
+class TestRenditions(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        product = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        with open(
+                "booktime/fixtures/the-cathedral-the-bazaar.jpg", "rb"
+        ) as f:
+            self.image = models.ProductImage.objects.create(
+                product=product,
+                image=ImageFile(f, name="tctb.jpg"),
+            )
+
+    def get(self, size, fmt):
+        return self.client.get(
+            reverse(
+                "booktime:rendition",
+                kwargs={
+                    "image_id": self.image.id, "size": size, "fmt": fmt,
+                },
+            )
+        )
+
+    def test_renditions_are_made_once_and_shared(self):
+        self.assertEqual(len(self.image.checksum), 40)
+        response = self.get("small", "webp")
+        name = renditions.rendition_name(
+            self.image.checksum, "small", "webp"
+        )
+        self.assertRedirects(
+            response, default_storage.url(name),
+            fetch_redirect_response=False,
+        )
+        with default_storage.open(name) as f:
+            rendition = Image.open(f)
+            self.assertEqual(rendition.format, "WEBP")
+            self.assertEqual(rendition.width, 160)
+        self.assertIn(
+            "%s 160w" % default_storage.url(name),
+            renditions.srcset(self.image.id, self.image.checksum, "webp"),
+        )
+        self.assertIn(
+            "/renditions/%d/large.webp 640w" % self.image.id,
+            renditions.srcset(self.image.id, self.image.checksum, "webp"),
+        )
+
+    def test_srcset_does_not_ask_the_storage(self):
+        self.get("small", "jpeg")
+        with patch.object(default_storage, "exists") as exists:
+            value = renditions.srcset(self.image.id, self.image.checksum)
+        exists.assert_not_called()
+        name = renditions.rendition_name(
+            self.image.checksum, "small", "jpeg"
+        )
+        self.assertIn("%s 160w" % default_storage.url(name), value)
+
+    def test_orphan_renditions_are_deleted(self):
+        self.get("small", "jpeg")
+        name = renditions.rendition_name(
+            self.image.checksum, "small", "jpeg"
+        )
+        self.image.image = ContentFile(b"another image", name="other.jpg")
+        self.image.save()
+        out = StringIO()
+        call_command(
+            "process_thumbnails", "--delete-orphans", "--workers", "1",
+            stdout=out,
+        )
+        self.assertIn("Orphan renditions deleted=1\n", out.getvalue())
+        self.assertFalse(default_storage.exists(name))
+        self.assertNotIn(
+            default_storage.url(name),
+            renditions.srcset(self.image.id, self.image.checksum),
+        )
+
+    def test_small_images_are_not_scaled_up(self):
+        data = BytesIO()
+        Image.new("RGB", (100, 50)).save(data, "PNG")
+        self.image.image = ContentFile(data.getvalue(), name="small.png")
+        self.image.save()
+        self.get("large", "jpeg")
+        name = renditions.rendition_name(
+            self.image.checksum, "large", "jpeg"
+        )
+        with default_storage.open(name) as f:
+            self.assertEqual(Image.open(f).size, (100, 50))
+
+    def test_unknown_renditions(self):
+        self.assertEqual(self.get("huge", "jpeg").status_code, 404)
+        self.assertEqual(self.get("small", "gif").status_code, 404)
+        self.image.image = ContentFile(b"not an image", name="broken.jpg")
+        self.image.save()
+        with self.assertLogs("booktime", level="WARNING"):
+            self.assertEqual(self.get("small", "jpeg").status_code, 404)
@@ -1,4 +1,9 @@
-from django.test import TestCase
+from io import StringIO
+import tempfile
+from unittest.mock import patch
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
 from booktime import models
 from django.core.files.images import ImageFile
 from decimal import Decimal
@@ -22,6 +27,20 @@ class TestSignal(TestCase):
                 image.save()
                 self.assertGreaterEqual(len(cm.output), 1)
                 image.refresh_from_db()
+        self.assertEqual(
+            image.thumbnail_status, models.ProductImage.THUMBNAIL_PENDING
+        )
+        self.assertFalse(image.thumbnail)
+        self.assertTrue(image.thumbnail_url.endswith("thumbnail-pending.svg"))
+        with self.assertLogs("booktime", level="INFO"):
+            call_command(
+                "process_thumbnails", "--workers", "1", stdout=StringIO()
+            )
+        image.refresh_from_db()
+        self.assertEqual(
+            image.thumbnail_status, models.ProductImage.THUMBNAIL_READY
+        )
+        self.assertRegex(image.thumbnail.name, r"^product-thumbnails/[^/]+$")
         with open(
                 "booktime/fixtures/the-cathedral-the-bazaar.thumb.jpg",
                 "rb",
@@ -32,6 +51,150 @@ class TestSignal(TestCase):
         image.image.delete(save=False)
 
 
+    @override_settings(BOOKTIME_THUMBNAILS_SYNC=True)
+    def test_thumbnails_can_be_generated_on_save(self):
+        product = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        with open(
+                "booktime/fixtures/the-cathedral-the-bazaar.jpg", "rb"
+        ) as f:
+            image = models.ProductImage.objects.create(
+                product=product,
+                image=ImageFile(f, name="tctb.jpg"),
+            )
+        image.refresh_from_db()
+        self.assertEqual(
+            image.thumbnail_status, models.ProductImage.THUMBNAIL_READY
+        )
+        self.assertTrue(image.thumbnail)
+        image.thumbnail.delete(save=False)
+        image.image.delete(save=False)
+
+    def test_failed_thumbnails_are_retried(self):
+        product = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        image = models.ProductImage.objects.create(
+            product=product,
+            image=ContentFile(b"not an image", name="broken.jpg"),
+        )
+        out = StringIO()
+        with self.assertLogs("booktime", level="WARNING"):
+            for attempt in range(3):
+                call_command(
+                    "process_thumbnails", "--workers", "2", stdout=out
+                )
+        self.assertEqual(
+            out.getvalue(), "Thumbnails processed=0 (failed=1)\n" * 3
+        )
+        image.refresh_from_db()
+        self.assertEqual(
+            image.thumbnail_status, models.ProductImage.THUMBNAIL_FAILED
+        )
+        self.assertEqual(image.thumbnail_attempts, 3)
+        self.assertIn("cannot identify image file", image.thumbnail_error)
+        image.image.delete(save=False)
+
+
+@override_settings(
+    BOOKTIME_THUMBNAILS_SYNC=True, MEDIA_ROOT=tempfile.mkdtemp()
+)
+class TestThumbnailFiles(TransactionTestCase):
+    # not TestCase: stale thumbnails are deleted once the save commits
+
+    def setUp(self):
+        product = models.Product.objects.create(
+            name="The cathedral and the bazaar",
+            price=Decimal("10.00"),
+        )
+        with open(
+                "booktime/fixtures/the-cathedral-the-bazaar.jpg", "rb"
+        ) as f:
+            self.data = f.read()
+        self.image = models.ProductImage.objects.create(
+            product=product, image=ContentFile(self.data, name="tctb.jpg"),
+        )
+        self.storage = self.image.thumbnail.storage
+        self.thumbnail = self.image.thumbnail.name
+
+    def test_unchanged_image_keeps_its_thumbnail(self):
+        with patch("booktime.thumbnails.render_thumbnail") as render:
+            self.image.save()
+            self.image.image = ContentFile(self.data, name="again.jpg")
+            self.image.save()
+        render.assert_not_called()
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.thumbnail.name, self.thumbnail)
+        self.assertEqual(
+            self.image.thumbnail_status, models.ProductImage.THUMBNAIL_READY
+        )
+        self.assertTrue(self.storage.exists(self.thumbnail))
+
+    @override_settings(BOOKTIME_THUMBNAILS_SYNC=False)
+    def test_replaced_image_drops_its_thumbnail(self):
+        self.image.image = ContentFile(b"another image", name="other.jpg")
+        self.image.save()
+        self.image.refresh_from_db()
+        self.assertFalse(self.image.thumbnail)
+        self.assertEqual(
+            self.image.thumbnail_status,
+            models.ProductImage.THUMBNAIL_PENDING,
+        )
+        self.assertFalse(self.storage.exists(self.thumbnail))
+
+    def test_deleted_image_drops_its_thumbnail(self):
+        self.image.delete()
+        self.assertFalse(self.storage.exists(self.thumbnail))
+
+    def test_orphan_thumbnails_are_deleted(self):
+        orphan = self.storage.save(
+            "product-thumbnails/orphan.jpg", ContentFile(b"orphan")
+        )
+        out = StringIO()
+        call_command(
+            "process_thumbnails", "--delete-orphans", "--workers", "1",
+            stdout=out,
+        )
+        self.assertEqual(
+            out.getvalue(),
+            "Thumbnails processed=0 (failed=0)\n"
+            "Orphan thumbnails deleted=1\n"
+            "Orphan renditions deleted=0\n",
+        )
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertTrue(self.storage.exists(self.thumbnail))
+
+    @override_settings(BOOKTIME_THUMBNAILS_SYNC=False)
+    def test_orphans_of_the_workers_are_deleted(self):
+        image = models.ProductImage.objects.create(
+            product=self.image.product,
+            image=ContentFile(self.data, name="queued.jpg"),
+        )
+        call_command(
+            "process_thumbnails", "--workers", "1", stdout=StringIO()
+        )
+        image.refresh_from_db()
+        orphan = image.thumbnail.name
+        models.ProductImage.objects.filter(pk=image.pk).update(
+            thumbnail=None
+        )
+        # where earlier workers put them
+        nested = self.storage.save(
+            "product-thumbnails/product-images/nested.jpg",
+            ContentFile(b"orphan"),
+        )
+        call_command(
+            "process_thumbnails", "--delete-orphans", "--workers", "1",
+            stdout=StringIO(),
+        )
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertFalse(self.storage.exists(nested))
+        self.assertTrue(self.storage.exists(self.thumbnail))
+
+
 class TestModel(TestCase):
     def test_active_manager_works(self):
         models.Product.objects.create(
@@ -1,6 +1,9 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
 from django.urls import reverse
-from booktime import forms
+from booktime import forms, views
 from decimal import Decimal
 from booktime import models
 from unittest.mock import patch
@@ -199,3 +202,98 @@ class TestPage(TestCase):
         )
         basket = models.Basket.objects.get(user=user1)
         self.assertEquals(basket.count(), 3)
+
+
+class TestProductListQueries(TestCase):
+    def setUp(self):
+        cache.clear()
+        tag = models.ProductTag.objects.create(
+            name="Open source", slug="opensource"
+        )
+        models.ProductTag.objects.create(name="Empty", slug="empty")
+        for i in range(12):
+            product = models.Product.objects.create(
+                name="Book %02d" % i,
+                slug="book-%02d" % i,
+                price=Decimal("10.00"),
+            )
+            product.tags.add(tag)
+            # bulk_create() skips the thumbnail signal
+            models.ProductImage.objects.bulk_create([
+                models.ProductImage(
+                    product=product,
+                    image="%d-%d.jpg" % (i, n),
+                    thumbnail="%d-%d.thumb.jpg" % (i, n),
+                )
+                for n in range(3)
+            ])
+
+    def get(self, tag):
+        return self.client.get(
+            reverse("booktime:products", kwargs={"tag": tag})
+        )
+
+    def test_query_budget_does_not_depend_on_page_size(self):
+        for paginate_by in (4, 12):
+            with patch.object(
+                    views.ProductListView, "paginate_by", paginate_by
+            ):
+                for tag in ("all", "opensource"):
+                    cache.clear()
+                    with self.assertNumQueries(
+                            views.ProductListView.query_budget
+                    ):
+                        response = self.get(tag)
+                    # product ids and tag sidebar are cached now
+                    with self.assertNumQueries(2):
+                        response = self.get(tag)
+                    self.assertEqual(
+                        len(response.context["object_list"]), paginate_by
+                    )
+        self.assertContains(response, "0-0.thumb.jpg")
+        self.assertNotContains(response, "0-1.thumb.jpg")
+
+    def test_tags(self):
+        self.assertEqual(self.get("empty").status_code, 200)
+        self.assertEqual(self.get("unknown").status_code, 404)
+
+    @override_settings(BOOKTIME_CURSOR_PAGINATION=True)
+    def test_cursor_pagination_walks_both_ways(self):
+        names = list(
+            models.Product.objects.order_by("name", "id").values_list(
+                "name", flat=True
+            )
+        )
+        pages, cursor = [], None
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse("booktime:products", kwargs={"tag": "all"}),
+                    {"cursor": cursor} if cursor else {},
+                )
+            # ids and sidebar are only loaded for the first page
+            self.assertLessEqual(
+                len(queries), views.ProductListView.query_budget
+            )
+            page = response.context["page_obj"]
+            self.assertEqual(page.count, 12)
+            pages.append([p.name for p in page])
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        self.assertEqual(sum(pages, []), names)
+        self.assertContains(response, "?cursor=%s" % page.previous_cursor)
+        response = self.client.get(
+            reverse("booktime:products", kwargs={"tag": "all"}),
+            {"cursor": page.previous_cursor},
+        )
+        self.assertEqual(
+            [p.name for p in response.context["page_obj"]], pages[-2]
+        )
+        response = self.client.get(
+            reverse("booktime:products", kwargs={"tag": "all"}),
+            {"cursor": "garbage"},
+        )
+        self.assertEqual(
+            [p.name for p in response.context["page_obj"]], pages[0]
+        )
@@ -0,0 +1,197 @@
+"""Thumbnail generation, outside of the request that saved the image.
+
+Saving a ProductImage only marks its thumbnail as pending (see
+signals.py). process_pending(), run by the process_thumbnails management
+command, renders pending thumbnails on a pool of worker processes.
+The workers only run code from imaging.py, which doesn't need the models.
+A failed render is retried on the next run until the attempts run out,
+then the image is marked as failed.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db.models import F
+from . import imaging, renditions
+from .imaging import render_thumbnail
+from .models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+
+def generate_thumbnail(instance):
+    """Render the thumbnail of instance in this process, without saving
+    the instance itself."""
+    instance.image.open("rb")
+    data = render_thumbnail(instance.image.read())
+    # set save=False, otherwise it will run in an infinite loop
+    instance.thumbnail.save(
+        instance.image.name, ContentFile(data), save=False
+    )
+    instance.thumbnail_status = ProductImage.THUMBNAIL_READY
+    instance.thumbnail_error = ""
+
+
+def delete_unused(name):
+    """Delete the thumbnail file name, unless an image still uses it"""
+    if not ProductImage.objects.filter(thumbnail=name).exists():
+        ProductImage._meta.get_field("thumbnail").storage.delete(name)
+
+
+def _walk(storage, directory):
+    """The names of the files under directory, subdirectories included"""
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield "%s/%s" % (directory, name)
+    for name in directories:
+        yield from _walk(storage, "%s/%s" % (directory, name))
+
+
+def delete_orphans(batch_size=500):
+    """Delete the files under the thumbnail directory that no image uses,
+    return how many."""
+    field = ProductImage._meta.get_field("thumbnail")
+    # older workers nested their thumbnails in product-images/
+    names = list(_walk(field.storage, field.upload_to))
+    deleted = 0
+    for i in range(0, len(names), batch_size):
+        batch = set(names[i:i + batch_size])
+        batch -= set(
+            ProductImage.objects.filter(thumbnail__in=batch).values_list(
+                "thumbnail", flat=True
+            )
+        )
+        for name in batch:
+            field.storage.delete(name)
+        deleted += len(batch)
+    return deleted
+
+
+def delete_orphan_renditions(batch_size=500):
+    """Delete the renditions of checksums that no image has any more,
+    return how many."""
+    storage = renditions.default_storage
+    try:
+        directories = storage.listdir(renditions.DIRECTORY)[0]
+    except FileNotFoundError:
+        return 0
+    deleted = 0
+    for directory in directories:
+        directory = "%s/%s" % (renditions.DIRECTORY, directory)
+        names = storage.listdir(directory)[1]
+        for i in range(0, len(names), batch_size):
+            # names are <checksum>-<size>.<extension>
+            batch = {
+                "%s/%s" % (directory, name): name.split("-")[0]
+                for name in names[i:i + batch_size]
+            }
+            used = set(
+                ProductImage.objects.filter(
+                    checksum__in=set(batch.values())
+                ).values_list("checksum", flat=True)
+            )
+            for name, checksum in batch.items():
+                if checksum not in used:
+                    storage.delete(name)
+                    cache.delete(renditions.url_cache_key(name))
+                    deleted += 1
+    return deleted
+
+
+def _read(image):
+    with image.image.open("rb") as f:
+        return f.read()
+
+
+def _store(image, data):
+    # the same name the synchronous path gives it, not nested under the
+    # image's own directory
+    name = image.thumbnail.field.generate_filename(
+        image, os.path.basename(image.image.name)
+    )
+    name = image.thumbnail.storage.save(name, ContentFile(data))
+    # Don't go through save(), and don't overwrite the thumbnail if the
+    # image has been replaced in the meantime.
+    updated = ProductImage.objects.filter(
+        pk=image.pk, image=image.image.name
+    ).update(
+        thumbnail=name,
+        thumbnail_status=ProductImage.THUMBNAIL_READY,
+        thumbnail_error="",
+    )
+    if not updated:
+        image.thumbnail.storage.delete(name)
+    return updated
+
+
+def _fail(image, error, max_attempts):
+    logger.warning(
+        "Thumbnail for image %d failed (attempt %d): %s",
+        image.id, image.thumbnail_attempts + 1, error,
+    )
+    status = ProductImage.THUMBNAIL_PENDING
+    if image.thumbnail_attempts + 1 >= max_attempts:
+        status = ProductImage.THUMBNAIL_FAILED
+    ProductImage.objects.filter(
+        pk=image.pk, image=image.image.name
+    ).update(
+        thumbnail_attempts=F("thumbnail_attempts") + 1,
+        thumbnail_status=status,
+        thumbnail_error=error,
+    )
+
+
+def process_pending(workers=None, batch_size=50, max_attempts=None):
+    """Render every pending thumbnail, return (done, failed) counts.
+
+    With workers=1 everything happens in this process, otherwise a pool
+    of that many processes (default: one per CPU) does the rendering.
+    Only run one of these at a time.
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, "BOOKTIME_THUMBNAIL_ATTEMPTS", 3)
+    done = failed = 0
+    pool = ProcessPoolExecutor(workers) if workers != 1 else None
+    try:
+        last_id = 0
+        while True:
+            batch = list(
+                ProductImage.objects.filter(
+                    id__gt=last_id,
+                    thumbnail_status=ProductImage.THUMBNAIL_PENDING,
+                ).order_by("id")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            images = {image.id: image for image in batch}
+            items = []
+            for image in batch:
+                try:
+                    items.append((image.id, _read(image)))
+                except Exception as e:
+                    _fail(image, "%s: %s" % (type(e).__name__, e),
+                          max_attempts)
+                    failed += 1
+            render = imaging.render_thumbnail_job
+            results = pool.map(render, items) if pool else map(render, items)
+            for image_id, data, error in results:
+                image = images[image_id]
+                if error is None and _store(image, data):
+                    logger.info(
+                        "Generated thumbnail for product %d",
+                        image.product_id,
+                    )
+                    done += 1
+                elif error is not None:
+                    _fail(image, error, max_attempts)
+                    failed += 1
+    finally:
+        if pool:
+            pool.shutdown()
+    return done, failed
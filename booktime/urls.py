@@ -56,6 +56,11 @@ urlpatterns = [
         "address/<int:pk>/delete/",
         views.AddressDeleteView.as_view(), name="address_delete",
     ),
+    path(
+        "renditions/<int:image_id>/<slug:size>.<slug:fmt>",
+        views.rendition,
+        name="rendition",
+    ),
     path("add_to_basket/", views.add_to_basket, name="add_to_basket", ),
 
     path('basket/', views.manage_basket, name="basket"),
@@ -74,7 +79,7 @@ urlpatterns = [
 
     path('api/', include(router.urls)),
     # path("mobile-api/auth/", authtoken_views.obtain_auth_token, name="mobile_token", ),
-    # path("mobile-api/my-orders/", endpoints.my_orders, name="mobile_my_orders", ),
+    path("mobile-api/my-orders/", endpoints.my_orders, name="mobile_my_orders", ),
     # path("mobile-api/my-orders/<int:order_id>/tracker/",
     #      AuthMiddlewareStack(consumers.OrderTrackerConsumer), ),
 
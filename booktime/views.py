@@ -3,11 +3,13 @@ from django.shortcuts import render
 from booktime import forms
 from django.views.generic.list import ListView
 from django.shortcuts import get_object_or_404
-from booktime import models
+from booktime import catalog, models, pagination, renditions
 import logging
+from django.conf import settings
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseRedirect
 # from django.contrib.auth import logout
 # from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
@@ -41,25 +43,58 @@ class ContactUsView(FormView):
 class ProductListView(ListView):
     template_name = "booktime/product_list.html"
     paginate_by = 4
+    # Queries a page may cost, whatever paginate_by is: product ids,
+    # products, thumbnails, and the tag sidebar of base_booktime.html.
+    # Ids and sidebar normally come from booktime.catalog's cache. Past
+    # catalog.ID_BLOCK products, counting them is one more on a miss.
+    query_budget = 4
 
     def get_queryset(self):
         tag = self.kwargs['tag']
-        self.tag = None
+        products = models.Product.objects.active()
         if tag != "all":
-            self.tag = get_object_or_404(
-                models.ProductTag, slug=tag
+            products = products.filter(tags__slug=tag)
+        # Only the first image of each product is shown.
+        first_image = models.ProductImage.objects.filter(
+            product=django_models.OuterRef("product")
+        ).order_by("id").values("id")[:1]
+        return products.prefetch_related(
+            django_models.Prefetch(
+                "productimage_set",
+                queryset=models.ProductImage.objects.filter(
+                    id=django_models.Subquery(first_image)
+                ),
+                to_attr="first_images",
             )
-        if self.tag:
-            products = models.Product.objects.active().filter(
-                tags=self.tag
+        ).order_by("name", "id")
+
+    def paginate_queryset(self, queryset, page_size):
+        ids = catalog.ProductIds(self.kwargs['tag'], queryset)
+        if getattr(settings, "BOOKTIME_CURSOR_PAGINATION", False):
+            # Keyset pagination: no OFFSET, the total is the cached count.
+            page = pagination.paginate_products(
+                queryset, self.request.GET.get("cursor"), page_size
             )
-        else:
-            products = models.Product.objects.active()
-        return products.order_by("name")
+            page.count = ids.count()
+            return (None, page, page.object_list, page.has_other_pages())
+        # Page through the cached ids and only load this page's products.
+        paginator, page, page_ids, is_paginated = super().paginate_queryset(
+            ids, page_size
+        )
+        products = queryset.in_bulk(page_ids)
+        page.object_list = [products[i] for i in page_ids if i in products]
+        return paginator, page, page.object_list, is_paginated
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = getattr(
+            settings, "BOOKTIME_CURSOR_PAGINATION", False
+        )
+        tag = self.kwargs['tag']
+        if tag != "all" and not context["object_list"]:
+            # Tell an unknown tag from one without products.
+            get_object_or_404(models.ProductTag, slug=tag)
         # Add in a QuerySet of all the books
         context['tag'] = self.kwargs['tag']
         return context
@@ -68,6 +103,19 @@ class ProductListView(ListView):
 logger = logging.getLogger(__name__)
 
 
+def rendition(request, image_id, size, fmt):
+    """Redirect to a rendition of the image, making it first if needed"""
+    if size not in renditions.SIZES or fmt not in renditions.FORMATS:
+        raise Http404("No such rendition")
+    image = get_object_or_404(models.ProductImage, id=image_id)
+    try:
+        name = renditions.get_rendition(image, size, fmt)
+    except OSError:
+        logger.warning("Cannot make renditions of image %d", image_id)
+        raise Http404("No such rendition")
+    return HttpResponseRedirect(default_storage.url(name))
+
+
 # class SignupView(FormView):
 #     template_name = "signup.html"
 #     form_class = forms.UserCreationForm
@@ -1,9 +1,16 @@
+import argparse
+import csv
+import json
 import os
+import time
+from collections import Counter
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tango_with_django.settings')
 import django
 
 django.setup()
+from django.db import transaction
+from django.template.defaultfilters import slugify
 from rango.models import Category, Page
 
 
@@ -64,9 +71,8 @@ def populate():
             add_page(c, p["title"], p["url"], p["views"])
 
     # Print out the categories we have added.
-    for c in Category.objects.all():
-        for p in Page.objects.filter(category=c):
-            print("- {0} - {1}".format(str(c), str(p)))
+    for p in Page.objects.select_related('category').order_by('category', 'id'):
+        print("- {0} - {1}".format(str(p.category), str(p)))
 
 
 def add_page(cat, title, url, views):
@@ -85,7 +91,173 @@ def add_cat(name, views, likes):
     return c
 
 
+# Bulk mode: stream categories and pages from a file and upsert them in
+# chunks. A JSON source is a fixture like rango.json, a CSV source has
+# category,title,url,views columns.
+
+def iter_json_records(f, read_size=1 << 16):
+    # Yields the objects of a top level JSON array one at a time, without
+    # loading the whole file.
+    decoder = json.JSONDecoder()
+    buf = f.read(read_size).lstrip()
+    if not buf.startswith('['):
+        raise ValueError("Expected a JSON array")
+    buf = buf[1:]
+    while True:
+        buf = buf.lstrip().lstrip(',').lstrip()
+        if buf.startswith(']'):
+            return
+        try:
+            record, end = decoder.raw_decode(buf)
+        except ValueError:
+            more = f.read(read_size)
+            if not more:
+                raise
+            buf += more
+            continue
+        yield record
+        buf = buf[end:]
+
+
+def iter_records(path):
+    # Normalises both formats to ('category', fields) and ('page', fields)
+    # records. Pages refer to their category by name.
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield 'page', {'category': row['category'],
+                               'title': row['title'],
+                               'url': row['url'],
+                               'views': int(row.get('views') or 0)}
+            return
+        category_names = {}
+        for record in iter_json_records(f):
+            fields = record['fields']
+            if record['model'] == 'rango.category':
+                category_names[record['pk']] = fields['name']
+                yield 'category', fields
+            elif record['model'] == 'rango.page':
+                fields = dict(fields,
+                              category=category_names[fields['category']])
+                yield 'page', fields
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def upsert_categories(categories, category_ids):
+    # categories maps name -> fields, category_ids caches name -> id
+    existing = {c.name: c for c in
+                Category.objects.filter(name__in=list(categories))}
+    to_update, to_create = [], []
+    for name, fields in categories.items():
+        cat = existing.get(name)
+        if cat is None:
+            cat = Category(name=name, slug=slugify(name))
+            to_create.append(cat)
+        else:
+            to_update.append(cat)
+        cat.views = fields.get('views', cat.views)
+        cat.likes = fields.get('likes', cat.likes)
+    Category.objects.bulk_update(to_update, ['views', 'likes'])
+    Category.objects.bulk_create(to_create)
+    category_ids.update(Category.objects.filter(
+        name__in=list(categories)).values_list('name', 'id'))
+    return len(to_create), len(to_update)
+
+
+def upsert_pages(pages, category_ids):
+    # pages maps (category name, title) -> fields
+    missing = {name for name, title in pages if name not in category_ids}
+    if missing:
+        upsert_categories({name: {} for name in missing}, category_ids)
+    keys = {(category_ids[name], title): fields
+            for (name, title), fields in pages.items()}
+    existing = {(p.category_id, p.title): p for p in Page.objects.filter(
+        category_id__in={cat_id for cat_id, title in keys},
+        title__in={title for cat_id, title in keys})}
+    to_update, to_create = [], []
+    for (cat_id, title), fields in keys.items():
+        page = existing.get((cat_id, title))
+        if page is None:
+            to_create.append(Page(category_id=cat_id, title=title,
+                                  url=fields['url'], views=fields['views']))
+        elif (page.url, page.views) != (fields['url'], fields['views']):
+            # bulk_update() is far slower than an insert, so leave rows
+            # that are already current alone.
+            page.url = fields['url']
+            page.views = fields['views']
+            to_update.append(page)
+    Page.objects.bulk_update(to_update, ['url', 'views'])
+    Page.objects.bulk_create(to_create)
+    return len(to_create), len(to_update)
+
+
+def bulk_populate(path, chunk_size=5000, rebuild_index=True):
+    # Imported here so the tutorial populate() above stays self-contained.
+    from rango import search
+    from rango.caching import bump_version
+    from rango.leaderboards import top_categories, top_pages
+
+    category_ids = {}
+    counts = Counter()
+    start = time.time()
+    for chunk in chunks(iter_records(path), chunk_size):
+        categories, pages = {}, {}
+        for kind, fields in chunk:
+            if kind == 'category':
+                categories[fields['name']] = fields
+            else:
+                pages[(fields['category'], fields['title'])] = fields
+        with transaction.atomic():
+            if categories:
+                created, updated = upsert_categories(categories, category_ids)
+                counts['categories created'] += created
+                counts['categories updated'] += updated
+            if pages:
+                created, updated = upsert_pages(pages, category_ids)
+                counts['pages created'] += created
+                counts['pages updated'] += updated
+        counts['rows'] += len(chunk)
+        elapsed = time.time() - start
+        print("{0} rows in {1:.1f}s ({2:.0f} rows/sec)".format(
+            counts['rows'], elapsed, counts['rows'] / elapsed))
+
+    # bulk_create() and bulk_update() bypass the signals that keep the
+    # derived data current, so bring it up to date in one go.
+    Category.objects.recount_pages()
+    if rebuild_index:
+        print("Rebuilding search index...")
+        search.rebuild_index()
+    bump_version('categories')
+    top_categories.invalidate()
+    top_pages.invalidate()
+    print(", ".join("{0}={1}".format(k, v) for k, v in sorted(counts.items())))
+    print("Done in {0:.1f}s".format(time.time() - start))
+    return counts
+
+
 # Start execution here!
 if __name__ == '__main__':
-    print("Starting Rango population script...")
-    populate()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bulk', metavar='FILE',
+                        help='stream categories and pages from a JSON '
+                             'fixture or CSV file')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--no-index', action='store_true',
+                        help='skip rebuilding the search index')
+    args = parser.parse_args()
+    if args.bulk:
+        print("Starting Rango bulk population from {0}...".format(args.bulk))
+        bulk_populate(args.bulk, args.chunk_size, not args.no_index)
+    else:
+        print("Starting Rango population script...")
+        populate()
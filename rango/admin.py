@@ -6,7 +6,7 @@ admin.site.register(UserProfile)
 
 
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'views', 'likes')
+    list_display = ('name', 'views', 'likes', 'page_count', 'total_page_views')
     prepopulated_fields = {'slug': ('name',)}
 
 
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class RangoConfig(AppConfig):
     name = 'rango'
+
+    def ready(self):
+        """This is enough to make sure that signals are registered"""
+        from . import signals
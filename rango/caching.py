@@ -0,0 +1,6 @@
+from functools import partial
+
+from tango_with_django import caching
+
+get_version = partial(caching.get_version, 'rango')
+bump_version = partial(caching.bump_version, 'rango')
@@ -0,0 +1,264 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import F
+
+from rango.leaderboards import top_categories, top_pages
+from rango.models import Category, DailyVisits, Page
+
+logger = logging.getLogger(__name__)
+
+
+def _can_return_rows(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return False
+
+
+def increment(model, field, pks, amount=1):
+    """Add amount to field on the rows in pks and return {pk: new value}.
+
+    Only field is written. Where the backend supports UPDATE ... RETURNING
+    the new values come back from the UPDATE itself, elsewhere they are
+    read back inside the same transaction.
+    """
+    pks = list(pks)
+    if not pks:
+        return {}
+    connection = connections[router.db_for_write(model)]
+    with transaction.atomic(using=connection.alias):
+        if _can_return_rows(connection):
+            qn = connection.ops.quote_name
+            opts = model._meta
+            column = qn(opts.get_field(field).column)
+            pk_column = qn(opts.pk.column)
+            sql = ('UPDATE {table} SET {col} = {col} + %s '
+                   'WHERE {pk} IN ({params}) RETURNING {pk}, {col}').format(
+                table=qn(opts.db_table), col=column, pk=pk_column,
+                params=', '.join(['%s'] * len(pks)))
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [amount] + pks)
+                return dict(cursor.fetchall())
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + amount})
+        return dict(model.objects.filter(pk__in=pks).values_list('pk', field))
+
+
+def increment_many(model, field, increments, batch_size=500):
+    """Apply {pk: amount} with one UPDATE per distinct amount.
+
+    Returns {pk: new value} like increment().
+    """
+    by_amount = defaultdict(list)
+    for pk, amount in increments.items():
+        by_amount[amount].append(pk)
+    totals = {}
+    with transaction.atomic():
+        for amount, pks in by_amount.items():
+            # Keep the IN () list under the backends' parameter limits.
+            for i in range(0, len(pks), batch_size):
+                totals.update(increment(model, field,
+                                        pks[i:i + batch_size], amount))
+    return totals
+
+
+class BufferedCounter(object):
+    """Write-behind counter for an integer column.
+
+    Increments are collected in process memory and written out as
+    ``UPDATE ... SET field = field + n`` statements, either when
+    ``flush_threshold`` increments have been buffered or when
+    ``flush_interval`` seconds have passed since the last flush.
+    Rows that received the same number of increments share one UPDATE.
+
+    The values written by the last flush are remembered, so incr_and_get()
+    can answer with a fresh count without reading the row again, and are
+    passed as {pk: new value} to every callable in flush_listeners.
+    """
+    batch_size = 500
+
+    def __init__(self, model, field, flush_interval=5.0, flush_threshold=100):
+        self.model = model
+        self.field = field
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.flush_listeners = []
+        self._pending = Counter()
+        self._totals = {}
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self._last_flush = time.monotonic()
+
+    def incr(self, pk, amount=1):
+        with self._lock:
+            self._pending[pk] += amount
+            self._buffered += amount
+            due = (self._buffered >= self.flush_threshold or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+            if not due:
+                self._schedule()
+        if due:
+            self.try_flush()
+
+    def incr_and_get(self, pk, amount=1):
+        """Increment pk and return its count including buffered increments,
+        or None if there is no row pk."""
+        self.incr(pk, amount)
+        with self._lock:
+            known = pk in self._totals
+        if not known:
+            # First increment of a burst: write it through to learn the
+            # current value, the rest of the burst is coalesced.
+            self.try_flush()
+        with self._lock:
+            if pk in self._totals:
+                return self._totals[pk] + self._pending.get(pk, 0)
+        # The flush failed or found no such row: read the stored value,
+        # whatever is still pending comes on top of it.
+        stored = self.model.objects.filter(pk=pk).values_list(
+            self.field, flat=True).first()
+        with self._lock:
+            if stored is None:
+                self._pending.pop(pk, None)
+                return None
+            return stored + self._pending.get(pk, 0)
+
+    def pending(self, pk):
+        """Increments for pk that have not reached the database yet."""
+        with self._lock:
+            return self._pending.get(pk, 0)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._buffered = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return pending
+        try:
+            totals = self.write(pending)
+        except Exception:
+            # Put the increments back so a failed flush doesn't lose them.
+            # They don't count towards the threshold again, or every
+            # incr() would retry the write straight away.
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        with self._lock:
+            # Only keep values this flush has just seen, older ones may
+            # have been changed by other processes in the meantime.
+            self._totals = totals
+        for listener in self.flush_listeners:
+            listener(totals)
+        return pending
+
+    def try_flush(self, retry=True):
+        """flush(), but log a database error instead of raising it.
+
+        Used wherever a failed batch write must not fail the caller, like
+        the request that clicked a link. The increments stay buffered and,
+        with retry, the timer tries them again.
+        """
+        try:
+            return self.flush()
+        except DatabaseError as e:
+            logger.warning("Could not flush %s.%s increments: %s",
+                           self.model.__name__, self.field, e)
+            if retry:
+                with self._lock:
+                    self._schedule()
+            return Counter()
+
+    def write(self, increments):
+        """Write increments to the database and return {pk: new value}."""
+        return increment_many(self.model, self.field, increments,
+                              self.batch_size)
+
+    def _schedule(self):
+        # Called with the lock held: make sure a quiet period still
+        # flushes whatever is left in the buffer.
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            # Let a failed flush below schedule the next attempt.
+            self._timer = None
+        try:
+            self.try_flush()
+        finally:
+            # The timer thread opened its own connection, don't leak it.
+            connections.close_all()
+
+
+class PageViewsCounter(BufferedCounter):
+    """BufferedCounter for Page.views that also keeps the categories'
+    total_page_views in step, in the same transaction."""
+
+    def write(self, increments):
+        with transaction.atomic():
+            totals = super(PageViewsCounter, self).write(increments)
+            per_category = Counter()
+            pks = list(increments)
+            for i in range(0, len(pks), self.batch_size):
+                for pk, category_id in Page.objects.filter(
+                        pk__in=pks[i:i + self.batch_size]).values_list(
+                        'pk', 'category_id'):
+                    if category_id is not None:
+                        per_category[category_id] += increments[pk]
+            increment_many(Category, 'total_page_views', per_category,
+                           self.batch_size)
+        return totals
+
+
+class DailyVisitsCounter(BufferedCounter):
+    """BufferedCounter keyed by date, creating missing DailyVisits rows."""
+
+    def write(self, increments):
+        with transaction.atomic():
+            existing = set(DailyVisits.objects.filter(
+                date__in=list(increments)).values_list('date', flat=True))
+            for date in set(increments) - existing:
+                DailyVisits.objects.get_or_create(date=date)
+            return super(DailyVisitsCounter, self).write(increments)
+
+
+page_views = PageViewsCounter(
+    Page, 'views',
+    flush_interval=getattr(settings, 'RANGO_VIEWS_FLUSH_INTERVAL', 5.0),
+    flush_threshold=getattr(settings, 'RANGO_VIEWS_FLUSH_THRESHOLD', 100),
+)
+
+# Only used when RANGO_COALESCE_LIKES is on, otherwise every like is a
+# single write-through UPDATE.
+category_likes = BufferedCounter(
+    Category, 'likes',
+    flush_interval=getattr(settings, 'RANGO_LIKES_FLUSH_INTERVAL', 1.0),
+    flush_threshold=getattr(settings, 'RANGO_LIKES_FLUSH_THRESHOLD', 50),
+)
+
+daily_visits = DailyVisitsCounter(
+    DailyVisits, 'visits',
+    flush_interval=getattr(settings, 'RANGO_VISITS_FLUSH_INTERVAL', 30.0),
+    flush_threshold=getattr(settings, 'RANGO_VISITS_FLUSH_THRESHOLD', 500),
+)
+
+page_views.flush_listeners.append(top_pages.update)
+category_likes.flush_listeners.append(top_categories.update)
+
+
+@atexit.register
+def flush_all():
+    for counter in (page_views, category_likes, daily_visits):
+        # No timer to retry with at exit.
+        counter.try_flush(retry=False)
@@ -1,4 +1,9 @@
-from datetime import datetime
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+
+from .counters import daily_visits
 
 
 # A helper method
@@ -31,21 +36,16 @@ def visitor_cookie_handler(request):
 
 
 def visits_counter(request):
-    ########################################################
-    # Mine
-    if 'last_visit' in request.session:
-        visits_counter = int(request.session.get('visits_counter'))
-        last_visit_cookie = request.session['last_visit']
-        last_visit_time = datetime.strptime(last_visit_cookie[:-7],
-                                            '%Y-%m-%d %H:%M:%S')
-        # If it's been more than a day since the last visit...
-        if (datetime.now() - last_visit_time).seconds > 0:
-            request.session['last_visit'] = str(datetime.now())
-            visits_counter += 1
-            request.session['visits_counter'] = visits_counter
-
-        print(visits_counter, request.session['last_visit'])
-    else:
-        request.session['visits_counter'] = 1
-        request.session['last_visit'] = str(datetime.now())
-    #########################################################
+    # A visit is counted at most once per RANGO_VISIT_WINDOW seconds, and
+    # the session is only written when one is. Repeat requests inside the
+    # window just read it.
+    window = getattr(settings, 'RANGO_VISIT_WINDOW', 30 * 60)
+    now = int(time.time())
+    last_visit = request.session.get('last_visit_ts')
+    if last_visit is None or now - last_visit >= window:
+        request.session['last_visit_ts'] = now
+        request.session['visits_counter'] = \
+            request.session.get('visits_counter', 0) + 1
+        # Site-wide totals are buffered and written out in batches.
+        daily_visits.incr(date.fromtimestamp(now))
+    return request.session['visits_counter']
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from rango.models import Category, Page
+
+
+class Leaderboard(object):
+    """Top rows of model by score_field, held in the cache.
+
+    Entries are dicts of fields sorted by score, highest first, ties
+    broken by id. Score changes are applied to the cached entries in
+    place; only changes that could let an unknown row into the board
+    (a member losing score, a member being deleted) drop the cache and
+    cause a rebuild from the database on the next read.
+
+    Updates from different processes are serialized with a lock taken
+    with cache.add(). An update that can't get the lock, like any
+    invalidation, drops the board and marks it dirty, so a concurrent
+    update doesn't write back a board missing its changes.
+
+    The cache has to be shared by all the processes (memcached, Redis,
+    the database cache): with LocMemCache each process keeps its own
+    board, and the others' flushes never reach it.
+    """
+    # seconds before the lock of a crashed update expires
+    lock_timeout = 10
+
+    def __init__(self, name, model, score_field, fields, size=5):
+        self.key = 'rango:leaderboard:%s' % name
+        self.lock_key = self.key + ':lock'
+        self.dirty_key = self.key + ':dirty'
+        self.model = model
+        self.score_field = score_field
+        self.fields = ('id', score_field) + tuple(fields)
+        self.size = size
+        self.timeout = getattr(settings, 'RANGO_LEADERBOARD_TIMEOUT', 300)
+
+    def _rank(self, entry):
+        return -entry[self.score_field], entry['id']
+
+    def top(self):
+        entries = cache.get(self.key)
+        if entries is None:
+            entries = self.rebuild()
+        return entries
+
+    def rebuild(self):
+        entries = list(self.model.objects
+                       .order_by('-' + self.score_field, 'id')
+                       .values(*self.fields)[:self.size])
+        # add(), not set(): don't replace a board an update just wrote.
+        cache.add(self.key, entries, self.timeout)
+        return entries
+
+    def invalidate(self):
+        cache.set(self.dirty_key, True, self.lock_timeout)
+        cache.delete(self.key)
+
+    def _qualifies(self, entries, pk, score):
+        if len(entries) < self.size:
+            return True
+        return (-score, pk) < self._rank(entries[-1])
+
+    def update(self, scores):
+        """Apply {pk: new score} to the cached board."""
+        if not cache.add(self.lock_key, True, self.lock_timeout):
+            # Another process is updating the board, let the next read
+            # rebuild it with both changes.
+            self.invalidate()
+            return
+        try:
+            cache.delete(self.dirty_key)
+            self._update(scores)
+            if cache.get(self.dirty_key):
+                # Invalidated while this update ran.
+                cache.delete(self.key)
+        finally:
+            cache.delete(self.lock_key)
+
+    def _update(self, scores):
+        entries = cache.get(self.key)
+        if entries is None:
+            # Nothing cached, the next read rebuilds from the database.
+            return
+        members = {entry['id']: entry for entry in entries}
+        newcomers = []
+        for pk, score in scores.items():
+            if pk in members:
+                if score < members[pk][self.score_field]:
+                    self.invalidate()
+                    return
+                members[pk][self.score_field] = score
+            elif self._qualifies(entries, pk, score):
+                newcomers.append(pk)
+        if newcomers:
+            for row in self.model.objects.filter(
+                    pk__in=newcomers).values(*self.fields):
+                members[row['id']] = row
+        entries = sorted(members.values(), key=self._rank)[:self.size]
+        cache.set(self.key, entries, self.timeout)
+
+    def saved(self, instance):
+        """Called when a row was saved outside of the counters."""
+        entries = cache.get(self.key)
+        if entries is None:
+            return
+        score = getattr(instance, self.score_field)
+        if (instance.pk in {entry['id'] for entry in entries} or
+                self._qualifies(entries, instance.pk, score)):
+            # Display fields may have changed too, rebuild on next read.
+            self.invalidate()
+
+    def deleted(self, instance):
+        entries = cache.get(self.key)
+        if entries and instance.pk in {entry['id'] for entry in entries}:
+            self.invalidate()
+
+
+top_categories = Leaderboard('categories', Category, 'likes', ('name', 'slug'))
+top_pages = Leaderboard('pages', Page, 'views', ('title',))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rango import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the rango page search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding search index")
+        start = time.time()
+        count = search.rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(
+            "Pages indexed=%d in %.1fs" % (count, time.time() - start))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rango.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute page_count and total_page_views of every category'
+
+    def handle(self, *args, **options):
+        count = Category.objects.recount_pages()
+        self.stdout.write("Categories recounted=%d" % count)
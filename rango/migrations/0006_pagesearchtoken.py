@@ -0,0 +1,68 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:16
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# A copy of rango.search's tokenizer as it was when this migration was
+# written, so later changes to the app don't change what it does.
+TITLE_WEIGHT = 2
+CATEGORY_WEIGHT = 1
+TOKEN_LENGTH = 32
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [token[:TOKEN_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+def page_tokens(title, category_name):
+    weights = Counter()
+    for token in set(tokenize(title)):
+        weights[token] += TITLE_WEIGHT
+    for token in set(tokenize(category_name or '')):
+        weights[token] += CATEGORY_WEIGHT
+    return weights
+
+
+def build_search_index(apps, schema_editor, batch_size=2000):
+    Page = apps.get_model('rango', 'Page')
+    PageSearchToken = apps.get_model('rango', 'PageSearchToken')
+    pages = Page.objects.order_by('id').values_list(
+        'id', 'title', 'category__name')
+    last_id = 0
+    while True:
+        rows = list(pages.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            return
+        PageSearchToken.objects.bulk_create([
+            PageSearchToken(token=token, page_id=page_id, weight=weight)
+            for page_id, title, category_name in rows
+            for token, weight in page_tokens(title, category_name).items()])
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0005_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageSearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=32)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='rango.Page')),
+            ],
+            options={
+                'unique_together': {('token', 'page')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0007_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVisits',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('visits', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily visits',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:21
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def recount_pages(apps, schema_editor):
+    Category = apps.get_model('rango', 'Category')
+    Page = apps.get_model('rango', 'Page')
+    pages = Page.objects.filter(category=models.OuterRef('pk')) \
+        .order_by().values('category')
+    Category.objects.update(
+        page_count=Coalesce(models.Subquery(
+            pages.annotate(c=models.Count('id')).values('c')), 0),
+        total_page_views=Coalesce(models.Subquery(
+            pages.annotate(s=models.Sum('views')).values('s')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0008_dailyvisits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='page_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='total_page_views',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(recount_pages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0009_category_page_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='page',
+            index=models.Index(fields=['category', '-views', '-id'], name='rango_page_category_views'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.template.defaultfilters import slugify
 from django.contrib.auth.models import User
 # Create your models here.
@@ -18,11 +19,39 @@ class UserProfile(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=128, unique=True)
     views = models.IntegerField(default=0)
-    likes = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0, db_index=True)
     slug = models.SlugField(unique=True)
+    # Aggregates over the category's pages, maintained by rango.signals
+    # and the page view counter. They drift over time: bulk updates and
+    # deletes skip the signals, and a page saved from a stale instance
+    # writes its old views back. Rebuild them with
+    # manage.py recount_categories, e.g. nightly.
+    page_count = models.IntegerField(default=0, editable=False)
+    total_page_views = models.IntegerField(default=0, editable=False)
+
+    AGGREGATE_FIELDS = ('page_count', 'total_page_views')
+
+    class CategoryManager(models.Manager):
+        def recount_pages(self):
+            """Recompute the page aggregates of every category in one UPDATE."""
+            pages = Page.objects.filter(category=models.OuterRef('pk')) \
+                .order_by().values('category')
+            return self.update(
+                page_count=Coalesce(models.Subquery(
+                    pages.annotate(c=models.Count('id')).values('c')), 0),
+                total_page_views=Coalesce(models.Subquery(
+                    pages.annotate(s=models.Sum('views')).values('s')), 0),
+            )
+
+    objects = CategoryManager()
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
+        if not self._state.adding and not kwargs.get('update_fields'):
+            # Never write back aggregates that may be stale in memory.
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.AGGREGATE_FIELDS]
         super(Category, self).save(*args, **kwargs)
 
     class Meta:
@@ -36,7 +65,40 @@ class Page(models.Model):
     category = models.ForeignKey(Category, null=True, on_delete=models.SET_NULL)
     title = models.CharField(max_length=128)
     url = models.URLField()
-    views = models.IntegerField(default=0)
+    views = models.IntegerField(default=0, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Serves the keyset pagination in show_category.
+            models.Index(fields=['category', '-views', '-id'],
+                         name='rango_page_category_views'),
+        ]
 
     def __str__(self):  # For Python 2, use __unicode__ too
         return self.title
+
+
+class PageSearchToken(models.Model):
+    """One row per (token, page), see rango.search."""
+    token = models.CharField(max_length=32, db_index=True)
+    page = models.ForeignKey(Page, on_delete=models.CASCADE,
+                             related_name='search_tokens')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('token', 'page')
+
+    def __str__(self):
+        return self.token
+
+
+class DailyVisits(models.Model):
+    """Site-wide visit totals, written in batches by rango.counters."""
+    date = models.DateField(primary_key=True)
+    visits = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily visits'
+
+    def __str__(self):
+        return '%s: %d' % (self.date, self.visits)
@@ -0,0 +1,34 @@
+from django.db.models import Q
+
+
+def encode_cursor(page):
+    return '%d.%d' % (page.views, page.id)
+
+
+def decode_cursor(cursor):
+    """Return the (views, id) position encoded in cursor, None if malformed."""
+    try:
+        views, page_id = cursor.split('.')
+        return int(views), int(page_id)
+    except ValueError:
+        return None
+
+
+def paginate_pages(pages, cursor=None, per_page=20):
+    """Keyset pagination of pages ordered by (-views, -id).
+
+    Each call reads at most per_page + 1 rows starting right after the
+    position in cursor, so it costs the same at any depth. Returns the
+    pages and the cursor of the next batch (None on the last one).
+    """
+    pages = pages.order_by('-views', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        views, page_id = position
+        pages = pages.filter(Q(views__lt=views) |
+                             Q(views=views, id__lt=page_id))
+    batch = list(pages[:per_page + 1])
+    if len(batch) > per_page:
+        batch = batch[:per_page]
+        return batch, encode_cursor(batch[-1])
+    return batch, None
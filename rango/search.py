@@ -0,0 +1,91 @@
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from rango.models import Page, PageSearchToken
+
+# A hit in the page title counts more than a hit in its category name.
+TITLE_WEIGHT = 2
+CATEGORY_WEIGHT = 1
+TOKEN_LENGTH = PageSearchToken._meta.get_field('token').max_length
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [token[:TOKEN_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+def page_tokens(title, category_name):
+    weights = Counter()
+    for token in set(tokenize(title)):
+        weights[token] += TITLE_WEIGHT
+    for token in set(tokenize(category_name or '')):
+        weights[token] += CATEGORY_WEIGHT
+    return weights
+
+
+def _build_tokens(rows):
+    # rows are (page id, title, category name) tuples
+    for page_id, title, category_name in rows:
+        for token, weight in page_tokens(title, category_name).items():
+            yield PageSearchToken(token=token, page_id=page_id, weight=weight)
+
+
+def index_pages(pages):
+    """Replace the index entries of the given Page queryset or list."""
+    if isinstance(pages, (list, tuple)):
+        rows = [(p.id, p.title, p.category.name if p.category else '')
+                for p in pages]
+    else:
+        rows = list(pages.values_list('id', 'title', 'category__name'))
+    with transaction.atomic():
+        PageSearchToken.objects.filter(
+            page_id__in=[row[0] for row in rows]).delete()
+        PageSearchToken.objects.bulk_create(_build_tokens(rows))
+
+
+def rebuild_index(batch_size=2000):
+    """Rebuild the whole index, batch_size pages per insert.
+
+    It all happens in one transaction, so searches keep using the old
+    index until the new one is complete. Returns the number of pages
+    indexed.
+    """
+    pages = Page.objects.order_by('id').values_list(
+        'id', 'title', 'category__name')
+    last_id, count = 0, 0
+    with transaction.atomic():
+        PageSearchToken.objects.all().delete()
+        while True:
+            rows = list(pages.filter(id__gt=last_id)[:batch_size])
+            if not rows:
+                return count
+            PageSearchToken.objects.bulk_create(_build_tokens(rows))
+            last_id = rows[-1][0]
+            count += len(rows)
+
+
+def search(query, limit=None):
+    """Pages matching any word of query, best matches first.
+
+    The last word is matched as a prefix so partially typed queries
+    still find something. Prefixes are looked up as an index range
+    rather than a LIKE, which the token index can serve on every backend.
+    """
+    if limit is None:
+        limit = getattr(settings, 'RANGO_SEARCH_LIMIT', 50)
+    terms = tokenize(query)
+    if not terms:
+        return Page.objects.none()
+    *words, prefix = terms
+    match = Q(search_tokens__token__gte=prefix,
+              search_tokens__token__lt=prefix + '\uffff')
+    if words:
+        match |= Q(search_tokens__token__in=words)
+    return (Page.objects.filter(match)
+            .select_related('category')
+            .annotate(score=Sum('search_tokens__weight'))
+            .order_by('-score', '-views', 'id')[:limit])
@@ -0,0 +1,116 @@
+from django.db.models import F, Subquery
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from rango import search
+from rango.caching import bump_version
+from rango.leaderboards import top_categories, top_pages
+from rango.models import Category, Page
+
+
+@receiver(post_save, sender=Page)
+def index_page(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_pages([instance])
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_name(sender, instance, raw=False, **kwargs):
+    instance._old_name = None
+    if instance.pk and not raw:
+        instance._old_name = Category.objects.filter(
+            pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_pages(sender, instance, created, raw=False, **kwargs):
+    # Category names are indexed with every page, so a rename has to
+    # re-index the whole category.
+    if raw or created:
+        return
+    if getattr(instance, '_old_name', None) != instance.name:
+        search.index_pages(instance.page_set.all())
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_pages(sender, instance, **kwargs):
+    instance._page_ids = list(
+        instance.page_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_orphaned_pages(sender, instance, **kwargs):
+    # The pages' category was set to NULL by a queryset update, which
+    # sends no Page signals, so their category tokens are still indexed.
+    page_ids = getattr(instance, '_page_ids', None)
+    if page_ids:
+        search.index_pages(Page.objects.filter(id__in=page_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_caches(sender, **kwargs):
+    bump_version('categories')
+
+
+@receiver(post_save, sender=Category)
+def update_category_leaderboard(sender, instance, **kwargs):
+    top_categories.saved(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_from_category_leaderboard(sender, instance, **kwargs):
+    top_categories.deleted(instance)
+
+
+@receiver(post_save, sender=Page)
+def update_page_leaderboard(sender, instance, **kwargs):
+    top_pages.saved(instance)
+
+
+@receiver(post_delete, sender=Page)
+def remove_from_page_leaderboard(sender, instance, **kwargs):
+    top_pages.deleted(instance)
+
+
+def _adjust_category(category_id, pages, views):
+    if category_id is not None and (pages or views):
+        Category.objects.filter(pk=category_id).update(
+            page_count=F('page_count') + pages,
+            total_page_views=F('total_page_views') + views)
+
+
+@receiver(pre_save, sender=Page)
+def remember_page_aggregates(sender, instance, raw=False, **kwargs):
+    instance._old_aggregates = None
+    if instance.pk and not raw:
+        instance._old_aggregates = Page.objects.filter(
+            pk=instance.pk).values_list('category_id', 'views').first()
+
+
+@receiver(post_save, sender=Page)
+def update_category_aggregates(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_aggregates', None)
+    if old is None:
+        _adjust_category(instance.category_id, 1, instance.views)
+    elif old[0] != instance.category_id:
+        _adjust_category(old[0], -1, -old[1])
+        _adjust_category(instance.category_id, 1, instance.views)
+    else:
+        _adjust_category(instance.category_id, 0, instance.views - old[1])
+
+
+@receiver(pre_delete, sender=Page)
+def remove_from_category_aggregates(sender, instance, **kwargs):
+    # Subtract the stored row, not the instance: clicks flushed since the
+    # page was loaded are in the database only.
+    page = Page.objects.filter(pk=instance.pk)
+    Category.objects.filter(pk=Subquery(page.values('category_id'))).update(
+        page_count=F('page_count') - 1,
+        total_page_views=F('total_page_views') - Subquery(
+            page.values('views')))
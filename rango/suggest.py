@@ -0,0 +1,48 @@
+import bisect
+import threading
+
+from rango.caching import get_version
+from rango.models import Category
+
+
+class CategoryPrefixIndex(object):
+    """Sorted array of category names answering prefix lookups with bisect.
+
+    The index is built from the database once and then kept in process
+    memory. It is rebuilt when the 'categories' cache version changes,
+    which Category signals bump on every save and delete.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._entries = []
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _load(self, version):
+        entries = sorted(
+            (name.lower(), name, slug)
+            for name, slug in Category.objects.values_list('name', 'slug'))
+        with self._lock:
+            self._keys = [entry[0] for entry in entries]
+            self._entries = entries
+            self._version = version
+
+    def suggest(self, prefix, limit=None):
+        """{'name', 'slug'} dicts whose name starts with prefix, in order."""
+        version = get_version('categories')
+        if version != self._version:
+            self._load(version)
+        prefix = prefix.lower()
+        with self._lock:
+            keys, entries = self._keys, self._entries
+        start = bisect.bisect_left(keys, prefix)
+        results = []
+        for key, name, slug in entries[start:]:
+            if not key.startswith(prefix) or len(results) == limit:
+                break
+            results.append({'name': name, 'slug': slug})
+        return results
+
+
+category_index = CategoryPrefixIndex()
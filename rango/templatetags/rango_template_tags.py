@@ -1,15 +1,34 @@
 from django import template
+from django.core.cache import cache
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+from rango.caching import get_version
 from rango.models import Category
-from booktime.models import ProductTag
+from booktime import catalog
 
 register = template.Library()
 
 
-@register.inclusion_tag('rango/cats.html')
+@register.simple_tag
 def get_category_list(cat=None):
-    return {'cats': Category.objects.all(), 'act_cat': cat}
+    # The sidebar is rendered once per version of the category list,
+    # Category signals bump the version. The active category is marked
+    # on the cached HTML afterwards so one fragment serves every page.
+    key = 'rango:sidebar:%s' % get_version('categories')
+    html = cache.get(key)
+    if html is None:
+        cats = Category.objects.values('name', 'slug')
+        html = render_to_string('rango/cats.html', {'cats': cats})
+        cache.set(key, html, getattr(settings, 'RANGO_SIDEBAR_TIMEOUT', 86400))
+    if cat:
+        link = 'class="nav-link" href="%s"' % reverse(
+            'rango:show_category', args=(cat.slug,))
+        html = html.replace(link, link.replace('nav-link', 'nav-link active'), 1)
+    return mark_safe(html)
 
 
-@register.inclusion_tag('tags.html')
+@register.simple_tag
 def get_tags_list(tag=None):
-    return {'tags': ProductTag.objects.all(), 'act_tag': tag}
\ No newline at end of file
+    return catalog.tags_sidebar(tag)
@@ -1,8 +1,19 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.contrib.staticfiles import finders
 
 
+def flush_counters():
+    # Views buffer clicks and visits in the module-level counters, write
+    # them out while the test database is still there.
+    from rango.counters import flush_all
+    flush_all()
+
+
+def tearDownModule():
+    flush_counters()
+
+
 # Thanks to Enzo Roiz https://github.com/enzoroiz who made these tests during an internship with us
 
 class GeneralTests(TestCase):
@@ -238,4 +249,595 @@ class Chapter7ViewTests(TestCase):
     # test if index contains link to add category page
     # <a href="/rango/add_category/">Add a New Category</a><br />
 
-    # test if the add_page.html template exists.
\ No newline at end of file
+    # test if the add_page.html template exists.
+
+class TrackUrlTests(TestCase):
+
+    def setUp(self):
+        from rango.models import Category, Page
+        cat = Category.objects.create(name='Python')
+        self.page = Page.objects.create(category=cat, title='Python docs',
+                                        url='https://docs.python.org/')
+
+    def test_goto_redirects_and_counts_view(self):
+        from rango.counters import page_views
+        response = self.client.get(reverse('rango:goto'),
+                                   {'page_id': self.page.id})
+        self.assertRedirects(response, self.page.url,
+                             fetch_redirect_response=False)
+        page_views.flush()
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.views, 1)
+
+    def test_goto_unknown_page_redirects_to_index(self):
+        response = self.client.get(reverse('rango:goto'), {'page_id': 'nope'})
+        self.assertRedirects(response, '/rango/')
+
+
+class BufferedCounterTests(TransactionTestCase):
+
+    def setUp(self):
+        from rango.models import Category, Page
+        cat = Category.objects.create(name='Python')
+        self.pages = [Page.objects.create(category=cat, title=str(i),
+                                          url='http://example.com/')
+                      for i in range(3)]
+
+    def tearDown(self):
+        flush_counters()
+
+    def test_increments_are_batched(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rango.counters import BufferedCounter
+        from rango.models import Page
+        counter = BufferedCounter(Page, 'views', flush_interval=60,
+                                  flush_threshold=1000)
+        with self.assertNumQueries(0):
+            for page in self.pages:
+                counter.incr(page.id)
+        # One UPDATE for all rows that got the same number of clicks.
+        with CaptureQueriesContext(connection) as ctx:
+            counter.flush()
+        updates = [q for q in ctx.captured_queries
+                   if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            list(Page.objects.values_list('views', flat=True)), [1, 1, 1])
+
+    def test_threshold_triggers_flush(self):
+        from rango.counters import BufferedCounter
+        from rango.models import Page
+        counter = BufferedCounter(Page, 'views', flush_interval=60,
+                                  flush_threshold=2)
+        counter.incr(self.pages[0].id)
+        self.assertEqual(counter.pending(self.pages[0].id), 1)
+        counter.incr(self.pages[0].id)
+        self.assertEqual(counter.pending(self.pages[0].id), 0)
+        self.pages[0].refresh_from_db()
+        self.assertEqual(self.pages[0].views, 2)
+
+    def test_no_increments_lost_under_concurrency(self):
+        import threading
+        from django.db import connection
+        from rango.counters import BufferedCounter
+        from rango.models import Page
+        counter = BufferedCounter(Page, 'views', flush_interval=60,
+                                  flush_threshold=1000)
+        threads, clicks = 8, 500
+
+        def click():
+            for i in range(clicks):
+                counter.incr(self.pages[i % len(self.pages)].id)
+            connection.close()
+
+        workers = [threading.Thread(target=click) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        counter.flush()
+        self.assertEqual(
+            sum(Page.objects.values_list('views', flat=True)),
+            threads * clicks)
+
+    def test_failed_flush_does_not_fail_the_click(self):
+        from django.db import OperationalError
+        from rango.counters import BufferedCounter
+        from rango.models import Page
+
+        class LockedCounter(BufferedCounter):
+            def write(self, increments):
+                raise OperationalError('database is locked')
+
+        counter = LockedCounter(Page, 'views', flush_interval=60,
+                                flush_threshold=1)
+        with self.assertLogs('rango.counters', 'WARNING'):
+            counter.incr(self.pages[0].id)
+            counter.incr(self.pages[0].id)
+        self.assertEqual(counter.pending(self.pages[0].id), 2)
+        counter._timer.cancel()
+
+
+class LikeCategoryTests(TestCase):
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from rango.models import Category
+        self.cat = Category.objects.create(name='Python', likes=5)
+        self.client.force_login(User.objects.create_user('liker', password='pw'))
+
+    def test_like_returns_fresh_count(self):
+        response = self.client.get(reverse('rango:like_category'),
+                                   {'category_id': self.cat.id})
+        self.assertEqual(response.content, b'6')
+        response = self.client.get(reverse('rango:like_category'),
+                                   {'category_id': self.cat.id, 'format': 'json'})
+        self.assertEqual(response.json(),
+                         {'category_id': self.cat.id, 'likes': 7})
+        self.cat.refresh_from_db()
+        self.assertEqual(self.cat.likes, 7)
+
+    def test_like_does_not_rewrite_slug(self):
+        from rango.models import Category
+        # A stale slug would be recomputed by Category.save()
+        Category.objects.filter(id=self.cat.id).update(slug='legacy-slug')
+        self.client.get(reverse('rango:like_category'),
+                        {'category_id': self.cat.id})
+        self.cat.refresh_from_db()
+        self.assertEqual(self.cat.slug, 'legacy-slug')
+
+    @override_settings(RANGO_COALESCE_LIKES=True)
+    def test_coalesced_likes(self):
+        from rango.counters import category_likes
+        counts = [self.client.get(reverse('rango:like_category'),
+                                  {'category_id': self.cat.id}).content
+                  for _ in range(3)]
+        self.assertEqual(counts, [b'6', b'7', b'8'])
+        category_likes.flush()
+        self.cat.refresh_from_db()
+        self.assertEqual(self.cat.likes, 8)
+
+    def test_missing_category_is_not_found(self):
+        url = reverse('rango:like_category')
+        response = self.client.get(url, {'category_id': self.cat.id + 1})
+        self.assertEqual(response.status_code, 404)
+        with self.settings(RANGO_COALESCE_LIKES=True):
+            response = self.client.get(url, {'category_id': self.cat.id + 1})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(RANGO_COALESCE_LIKES=True)
+    def test_coalesced_like_counts_the_stored_likes_when_flush_fails(self):
+        from unittest.mock import patch
+        from django.db import OperationalError
+        from rango.counters import category_likes
+        from rango.models import Category
+        Category.objects.filter(id=self.cat.id).update(likes=500)
+        # no count left over from other tests
+        with patch.object(category_likes, '_totals', {}):
+            with patch.object(category_likes, 'write',
+                              side_effect=OperationalError('locked')), \
+                    self.assertLogs('rango.counters', level='WARNING'):
+                response = self.client.get(reverse('rango:like_category'),
+                                           {'category_id': self.cat.id})
+            self.assertEqual(response.content, b'501')
+            category_likes.flush()
+        self.cat.refresh_from_db()
+        self.assertEqual(self.cat.likes, 501)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        from rango.models import Category, Page
+        python = Category.objects.create(name='Python')
+        django = Category.objects.create(name='Django')
+        self.tutorial = Page.objects.create(category=python,
+                                            title='Official Python Tutorial',
+                                            url='http://docs.python.org/')
+        self.rocks = Page.objects.create(category=django, title='Django Rocks',
+                                         url='http://www.djangorocks.com/')
+        self.tango = Page.objects.create(category=django,
+                                         title='How to Tango with Django',
+                                         url='http://www.tangowithdjango.com/')
+
+    def test_title_and_category_matches_are_ranked(self):
+        from rango.search import search
+        self.assertEqual(list(search('django')),
+                         [self.rocks, self.tango])
+        self.assertEqual(list(search('python tutorial')), [self.tutorial])
+
+    def test_last_word_matches_as_prefix(self):
+        from rango.search import search
+        self.assertEqual(list(search('tan')), [self.tango])
+        self.assertEqual(list(search('')), [])
+
+    def test_index_follows_renames(self):
+        from rango.search import search
+        cat = self.tutorial.category
+        cat.name = 'Snakes'
+        cat.save()
+        self.assertEqual(list(search('snakes')), [self.tutorial])
+        self.tango.title = 'Tango lessons'
+        self.tango.save()
+        self.assertEqual(list(search('lessons')), [self.tango])
+
+    def test_index_follows_category_deletes(self):
+        from rango.models import Category, Page
+        from rango.search import search
+        erlang = Category.objects.create(name='Erlang')
+        page = Page.objects.create(category=erlang, title='Learn You Some',
+                                   url='http://learnyousomeerlang.com/')
+        self.assertEqual(list(search('erlang')), [page])
+        erlang.delete()
+        self.assertEqual(list(search('erlang')), [])
+        self.assertEqual(list(search('learn')), [page])
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from rango.models import PageSearchToken
+        from rango.search import search
+        PageSearchToken.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Pages indexed=3', out.getvalue())
+        self.assertEqual(list(search('rocks')), [self.rocks])
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        from unittest.mock import patch
+        from rango import search
+        build_tokens = search._build_tokens
+        batches = []
+
+        def fail_second_batch(rows):
+            batches.append(rows)
+            if len(batches) == 2:
+                raise RuntimeError('interrupted')
+            return build_tokens(rows)
+
+        with patch.object(search, '_build_tokens', fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                search.rebuild_index(batch_size=2)
+        self.assertEqual(list(search.search('tango')), [self.tango])
+
+    def test_search_view_uses_index(self):
+        response = self.client.get(reverse('rango:search'), {'query': 'tango'})
+        self.assertEqual(list(response.context['result_list']), [self.tango])
+
+
+class SuggestCategoryTests(TestCase):
+
+    def setUp(self):
+        from rango.models import Category
+        for name in ['Python', 'Pyramid', 'Django', 'Perl']:
+            Category.objects.create(name=name)
+
+    def test_prefix_lookup_skips_database(self):
+        from rango.suggest import category_index
+        category_index.suggest('p')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [c['name'] for c in category_index.suggest('PY')],
+                ['Pyramid', 'Python'])
+            self.assertEqual(len(category_index.suggest('p', 2)), 2)
+
+    def test_index_follows_category_changes(self):
+        from rango.models import Category
+        from rango.suggest import category_index
+        self.assertEqual(category_index.suggest('pyt'),
+                         [{'name': 'Python', 'slug': 'python'}])
+        Category.objects.create(name='Pytest')
+        Category.objects.get(name='Python').delete()
+        self.assertEqual(category_index.suggest('pyt'),
+                         [{'name': 'Pytest', 'slug': 'pytest'}])
+
+    def test_json_mode(self):
+        response = self.client.get(reverse('rango:suggest_category'),
+                                   {'suggestion': 'dj', 'format': 'json'})
+        self.assertEqual(response.json(), {'categories': [
+            {'name': 'Django', 'slug': 'django',
+             'url': reverse('rango:show_category', args=('django',))}]})
+        response = self.client.get(reverse('rango:suggest_category'),
+                                   {'suggestion': 'dj'})
+        self.assertContains(response, 'Django')
+
+
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from rango.models import Category, Page
+        cache.clear()
+        self.cats = [Category.objects.create(name='cat %d' % i, likes=i)
+                     for i in range(7)]
+        self.pages = [Page.objects.create(category=self.cats[0],
+                                          title='page %d' % i,
+                                          url='http://example.com/', views=i)
+                      for i in range(7)]
+
+    def test_top_is_cached(self):
+        from rango.leaderboards import top_categories
+        self.assertEqual([c['likes'] for c in top_categories.top()],
+                         [6, 5, 4, 3, 2])
+        with self.assertNumQueries(0):
+            top_categories.top()
+
+    def test_likes_update_board_in_place(self):
+        from rango.counters import increment
+        from rango.leaderboards import top_categories
+        from rango.models import Category
+        top_categories.top()
+        top_categories.update(increment(Category, 'likes', [self.cats[6].id]))
+        with self.assertNumQueries(0):
+            self.assertEqual(top_categories.top()[0]['likes'], 7)
+        # A row outside the board overtaking the last member is loaded.
+        top_categories.update(
+            increment(Category, 'likes', [self.cats[0].id], 10))
+        self.assertEqual([c['name'] for c in top_categories.top()],
+                         ['cat 0', 'cat 6', 'cat 5', 'cat 4', 'cat 3'])
+
+    def test_concurrent_update_drops_the_board(self):
+        from django.core.cache import cache
+        from rango.counters import increment
+        from rango.leaderboards import top_categories
+        from rango.models import Category
+        top_categories.top()
+        # Another process holds the lock: rather than race it, the board
+        # is rebuilt on the next read.
+        cache.add(top_categories.lock_key, True)
+        top_categories.update(increment(Category, 'likes', [self.cats[6].id]))
+        self.assertIsNone(cache.get(top_categories.key))
+        cache.delete(top_categories.lock_key)
+        self.assertEqual(top_categories.top()[0]['likes'], 7)
+
+    def test_invalidation_during_update_wins(self):
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from rango.counters import increment
+        from rango.leaderboards import top_categories
+        from rango.models import Category
+        top_categories.top()
+        scores = increment(Category, 'likes', [self.cats[6].id])
+        real_set = cache.set
+
+        def set_after_invalidation(key, *args, **kwargs):
+            if key == top_categories.key:
+                # A rename elsewhere, between the update's read and write.
+                top_categories.invalidate()
+            return real_set(key, *args, **kwargs)
+
+        with patch.object(cache, 'set', set_after_invalidation):
+            top_categories.update(scores)
+        self.assertIsNone(cache.get(top_categories.key))
+
+    def test_view_counter_feeds_page_board(self):
+        from rango.counters import page_views
+        from rango.leaderboards import top_pages
+        top_pages.top()
+        for _ in range(10):
+            page_views.incr(self.pages[1].id)
+        page_views.flush()
+        self.assertEqual(top_pages.top()[0],
+                         {'id': self.pages[1].id, 'views': 11,
+                          'title': 'page 1'})
+
+    def test_index_uses_leaderboards(self):
+        self.client.get(reverse('rango:index'))
+        response = self.client.get(reverse('rango:index'))
+        self.assertEqual(len(response.context['categories']), 5)
+        self.assertContains(response, 'page 6')
+        self.cats[6].delete()
+        response = self.client.get(reverse('rango:index'))
+        self.assertNotContains(response, 'cat 6')
+
+
+class CategorySidebarTests(TestCase):
+
+    def setUp(self):
+        from rango.models import Category
+        self.python = Category.objects.create(name='Python')
+        self.django = Category.objects.create(name='Django')
+
+    def render(self, cat=None):
+        from django.template import Context, Template
+        return Template('{% load rango_template_tags %}'
+                        '{% get_category_list cat %}').render(
+            Context({'cat': cat}))
+
+    def test_sidebar_is_cached_and_highlights_active(self):
+        self.render()
+        with self.assertNumQueries(0):
+            html = self.render(self.django)
+        self.assertIn('class="nav-link active" href="/rango/category/django"',
+                      html)
+        self.assertIn('class="nav-link" href="/rango/category/python"', html)
+
+    def test_sidebar_follows_category_changes(self):
+        from rango.models import Category
+        self.render()
+        Category.objects.create(name='Flask')
+        self.assertIn('Flask', self.render())
+        self.python.delete()
+        self.assertNotIn('Python', self.render())
+
+
+class VisitsCounterTests(TestCase):
+
+    def test_session_written_once_per_window(self):
+        from django.contrib.sessions.middleware import SessionMiddleware
+        from django.test import RequestFactory
+        from rango.helper_fun import visits_counter
+        request = RequestFactory().get('/rango/')
+        SessionMiddleware().process_request(request)
+        self.assertEqual(visits_counter(request), 1)
+        request.session.save()
+        request.session.modified = False
+        self.assertEqual(visits_counter(request), 1)
+        self.assertFalse(request.session.modified)
+        request.session['last_visit_ts'] -= 31 * 60
+        self.assertEqual(visits_counter(request), 2)
+
+    def test_daily_totals_are_batched(self):
+        from datetime import date
+        from rango.counters import daily_visits
+        from rango.models import DailyVisits
+        daily_visits.flush()
+        DailyVisits.objects.all().delete()
+        self.client.get(reverse('rango:index'))
+        self.client.get(reverse('rango:index'))
+        self.client.logout()
+        self.client.get(reverse('rango:index'))
+        self.assertFalse(DailyVisits.objects.exists())
+        daily_visits.flush()
+        self.assertEqual(DailyVisits.objects.get(date=date.today()).visits, 2)
+
+
+class CategoryAggregateTests(TestCase):
+
+    def setUp(self):
+        from rango.models import Category
+        self.python = Category.objects.create(name='Python')
+        self.django = Category.objects.create(name='Django')
+
+    def assertAggregates(self, cat, page_count, total_page_views):
+        cat.refresh_from_db()
+        self.assertEqual((cat.page_count, cat.total_page_views),
+                         (page_count, total_page_views))
+
+    def test_page_signals_maintain_aggregates(self):
+        from rango.models import Page
+        page = Page.objects.create(category=self.python, title='Docs',
+                                   url='http://docs.python.org/', views=10)
+        Page.objects.create(category=self.python, title='Tutorial',
+                            url='http://docs.python.org/', views=5)
+        self.assertAggregates(self.python, 2, 15)
+        page.category = self.django
+        page.views = 12
+        page.save()
+        self.assertAggregates(self.python, 1, 5)
+        self.assertAggregates(self.django, 1, 12)
+        page.delete()
+        self.assertAggregates(self.django, 0, 0)
+
+    def test_view_counter_updates_category_total(self):
+        from rango.counters import page_views
+        from rango.models import Page
+        page = Page.objects.create(category=self.python, title='Docs',
+                                   url='http://docs.python.org/')
+        for _ in range(3):
+            page_views.incr(page.id)
+        page_views.flush()
+        self.assertAggregates(self.python, 1, 3)
+        # page.views is still 0 in memory, the flushed clicks go too.
+        page.delete()
+        self.assertAggregates(self.python, 0, 0)
+
+    def test_category_save_keeps_aggregates(self):
+        from rango.models import Category, Page
+        stale = Category.objects.get(pk=self.python.pk)
+        Page.objects.create(category=self.python, title='Docs',
+                            url='http://docs.python.org/', views=4)
+        stale.name = 'Python 3'
+        stale.save()
+        self.assertAggregates(self.python, 1, 4)
+
+    def test_recount_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from rango.models import Category, Page
+        Page.objects.bulk_create([
+            Page(category=self.django, title=str(i), url='http://x.com/',
+                 views=i) for i in range(4)])
+        self.assertAggregates(self.django, 0, 0)
+        out = StringIO()
+        call_command('recount_categories', stdout=out)
+        self.assertEqual(out.getvalue(), 'Categories recounted=2\n')
+        self.assertAggregates(self.django, 4, 6)
+        self.assertAggregates(self.python, 0, 0)
+
+
+class CategoryPaginationTests(TestCase):
+
+    def setUp(self):
+        from rango.models import Category, Page
+        self.cat = Category.objects.create(name='Python')
+        Page.objects.bulk_create([
+            Page(category=self.cat, title='page %d' % i,
+                 url='http://example.com/', views=i % 3)
+            for i in range(7)])
+
+    @override_settings(RANGO_PAGES_PER_PAGE=3)
+    def test_cursor_walks_every_page_once(self):
+        from rango.models import Page
+        url = reverse('rango:show_category', args=('python',))
+        seen, cursor = [], None
+        while True:
+            params = {'after': cursor} if cursor else {}
+            response = self.client.get(url, params)
+            seen.extend(response.context['pages'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+            self.assertContains(response, '?after=%s' % cursor)
+        expected = Page.objects.order_by('-views', '-id')
+        self.assertEqual(seen, list(expected))
+
+    @override_settings(RANGO_PAGES_PER_PAGE=3)
+    def test_fragment_and_bad_cursor(self):
+        url = reverse('rango:show_category', args=('python',))
+        response = self.client.get(url, {'after': '2.5', 'format': 'fragment'})
+        self.assertTemplateUsed(response, 'rango/page_list.html')
+        self.assertTemplateNotUsed(response, 'rango/category.html')
+        response = self.client.get(url, {'after': 'garbage'})
+        self.assertEqual(len(response.context['pages']), 3)
+
+
+class BulkPopulateTests(TestCase):
+
+    def bulk_populate(self, path, **kwargs):
+        import contextlib
+        import io
+        from populate_rango import bulk_populate
+        with contextlib.redirect_stdout(io.StringIO()):
+            return bulk_populate(path, **kwargs)
+
+    def test_json_fixture(self):
+        from rango.models import Category, Page
+        counts = self.bulk_populate('rango.json', chunk_size=5)
+        self.assertEqual(counts['categories created'], 4)
+        self.assertEqual(counts['pages created'], 9)
+        python = Category.objects.get(name='Python')
+        self.assertEqual(python.slug, 'python')
+        self.assertEqual(python.page_count, python.page_set.count())
+        self.assertEqual(Page.objects.count(), 9)
+        # Loading the same file again leaves the unchanged pages alone.
+        counts = self.bulk_populate('rango.json', chunk_size=5)
+        self.assertEqual(counts['categories updated'], 4)
+        self.assertEqual(counts['pages created'], 0)
+        self.assertEqual(counts['pages updated'], 0)
+        self.assertEqual(Page.objects.count(), 9)
+
+    def test_csv_upserts_by_category_and_title(self):
+        import os
+        import tempfile
+        from rango.models import Category, Page
+        from rango.search import search
+        cat = Category.objects.create(name='Python', views=10)
+        Page.objects.create(category=cat, title='Docs', url='http://old/')
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            f.write('category,title,url,views\n'
+                    'Python,Docs,http://docs.python.org/,7\n'
+                    'Python,Tutorial,http://learnpython.org/,3\n'
+                    'Erlang,Home,http://erlang.org/,1\n')
+        counts = self.bulk_populate(path)
+        self.assertEqual(counts['pages created'], 2)
+        self.assertEqual(counts['pages updated'], 1)
+        docs = Page.objects.get(title='Docs')
+        self.assertEqual((docs.url, docs.views), ('http://docs.python.org/', 7))
+        self.assertEqual(Category.objects.get(name='Python').views, 10)
+        erlang = Category.objects.get(name='Erlang')
+        self.assertEqual((erlang.page_count, erlang.total_page_views), (1, 1))
+        self.assertEqual([p.title for p in search('erlang')], ['Home'])
@@ -1,15 +1,22 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import (
+    Http404, HttpResponse, HttpResponseRedirect, JsonResponse,
+)
 from rango.models import Category, Page, UserProfile
 from django.contrib.auth.models import User
-from django.db.models import Q
 from rango.forms import CategoryForm, PageForm, UserForm, UserProfileForm
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from .helper_fun import visits_counter
+from .counters import category_likes, increment, page_views
+from .search import search as search_pages
+from .suggest import category_index
+from .leaderboards import top_categories, top_pages
+from .pagination import paginate_pages
 from registration.backends.simple.views import RegistrationView
 from django.conf.urls import url
+from django.conf import settings
 
 
 # Create a new class that redirects the user to the index page,
@@ -33,8 +40,10 @@ def index(request):
     # Retrieve the top 5 only - or all if less than 5.
     # Place the list in our context_dict dictionary
     # that will be passed to the template engine.
-    category_list = Category.objects.order_by('-likes')[:5]
-    page_list = Page.objects.order_by('-views')[:5]
+    # Both lists are cached and kept up to date by the like and view
+    # counters, see rango.leaderboards.
+    category_list = top_categories.top()
+    page_list = top_pages.top()
     context_dict = {'categories': category_list,
                     'pages': page_list,
                     'visits': request.session.get('visits_counter'), }
@@ -53,11 +62,15 @@ def show_category(request, category_name_slug):
         # If we can't, the .get() method raises a DoesNotExist exception.
         # So the .get() method returns one model instance or raises an exception.
         category = Category.objects.get(slug=category_name_slug)
-        # Retrieve all of the associated pages.
-        # Note that filter() will return a list of page objects or an empty list
-        pages = Page.objects.filter(category=category).order_by('-views')
+        # Retrieve one batch of the associated pages, starting after the
+        # position in ?after= (see rango.pagination).
+        pages, next_cursor = paginate_pages(
+            Page.objects.filter(category=category),
+            request.GET.get('after'),
+            getattr(settings, 'RANGO_PAGES_PER_PAGE', 20))
         # Adds our results list to the template context under name pages.
         context_dict['pages'] = pages
+        context_dict['next_cursor'] = next_cursor
         # We also add the category object from
         # the database to the context dictionary.
         # We'll use this in the template to verify that the category exists.
@@ -74,10 +87,12 @@ def show_category(request, category_name_slug):
     if request.method == 'GET':
         if 'query' in request.GET:
             query = request.GET['query'].strip()
-            result_list = Page.objects.filter(Q(category__name__icontains=query) |
-                                              Q(title__icontains=query))
+            result_list = search_pages(query)
     context_dict['result_list'] = result_list
 
+    if request.GET.get('format') == 'fragment':
+        # Infinite scroll only needs the next batch of list items.
+        return render(request, 'rango/page_list.html', context_dict)
     return render(request, 'rango/category.html', context_dict)
 
 
@@ -273,8 +288,7 @@ def search(request):
     if request.method == 'GET':
         if 'query' in request.GET:
             query = request.GET['query'].strip()
-            result_list = Page.objects.filter(Q(category__name__icontains=query) |
-                                              Q(title__icontains=query))
+            result_list = search_pages(query)
     return render(request, 'rango/search.html', {'result_list': result_list})
 
 
@@ -285,11 +299,12 @@ def track_url(request):
         if 'page_id' in request.GET:
             page_id = request.GET['page_id']
             try:
-                page = Page.objects.get(id=page_id)
-                page.views = page.views + 1
-                page.save()
-                url = page.url
-            except:
+                page_id, url = Page.objects.values_list(
+                    'id', 'url').get(id=page_id)
+                # The click itself is buffered and written out in batches,
+                # see rango.counters.
+                page_views.incr(page_id)
+            except (Page.DoesNotExist, ValueError):
                 pass
     return redirect(url)
 
@@ -301,21 +316,27 @@ def like_category(request):
     if request.method == 'GET':
         cat_id = request.GET.get('category_id')
         if cat_id:
-            cat = Category.objects.get(id=int(cat_id))
-            if cat:
-                likes = cat.likes + 1
-                cat.likes = likes
-                cat.save()
+            cat_id = int(cat_id)
+            # Only the likes column is touched, and the new value comes
+            # back from the UPDATE so there is no extra read.
+            if getattr(settings, 'RANGO_COALESCE_LIKES', False):
+                likes = category_likes.incr_and_get(cat_id)
+            else:
+                totals = increment(Category, 'likes', [cat_id])
+                top_categories.update(totals)
+                likes = totals.get(cat_id)
+            if likes is None:
+                raise Http404('No such category')
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'category_id': cat_id, 'likes': likes})
     return HttpResponse(likes)
 
 
 def get_category_list(max_results=0, starts_with=''):
+    # Answered from the in-process prefix index, not the database.
     cat_list = []
     if starts_with:
-        cat_list = Category.objects.filter(name__istartswith=starts_with)
-    if max_results > 0:
-        if len(cat_list) > max_results:
-            cat_list = cat_list[:max_results]
+        cat_list = category_index.suggest(starts_with, max_results or None)
     return cat_list
 
 
@@ -323,8 +344,12 @@ def suggest_category(request):
     cat_list = []
     starts_with = ''
     if request.method == 'GET':
-        starts_with = request.GET['suggestion']
+        starts_with = request.GET.get('suggestion', '')
     cat_list = get_category_list(8, starts_with)
+    if request.GET.get('format') == 'json':
+        for cat in cat_list:
+            cat['url'] = reverse('rango:show_category', args=(cat['slug'],))
+        return JsonResponse({'categories': cat_list})
     return render(request, 'rango/cats.html', {'cats': cat_list })
 
 
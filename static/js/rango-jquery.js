@@ -10,10 +10,45 @@ $(document).ready(function() {
             });
     });
     $('#suggestion').keyup(function(){
-        $.get('/rango/suggest/', {'suggestion': $(this).val()} )
+        $.getJSON('/rango/suggest/', {'suggestion': $(this).val(), 'format': 'json'})
             .done(function(data) {
-                $('#cats').html( data )
-
+                var list = $('<ul class="nav nav-pills flex-column"></ul>');
+                $.each(data.categories, function(i, cat) {
+                    $('<li class="nav-item"><a class="nav-link"></a></li>')
+                        .find('a').attr('href', cat.url).text(cat.name).end()
+                        .appendTo(list);
+                });
+                if (!data.categories.length) {
+                    list.append('<li class="nav-item"> <strong>There are no categories present.</strong></li>');
+                }
+                $('#cats').empty().append(list);
             });
     });
-});
\ No newline at end of file
+    // Infinite scroll through a category's pages: the "More pages" link
+    // carries the cursor of the next batch.
+    var loadingPages = false;
+    function loadMorePages(link) {
+        if (loadingPages) {
+            return;
+        }
+        loadingPages = true;
+        $.get(link.attr('href'), {format: 'fragment'})
+            .done(function(data) {
+                link.closest('li').replaceWith(data);
+            })
+            .always(function() {
+                loadingPages = false;
+            });
+    }
+    $('#pages').on('click', '.more-pages a', function(event) {
+        event.preventDefault();
+        loadMorePages($(this));
+    });
+    $(window).scroll(function() {
+        var link = $('#pages .more-pages a');
+        if (link.length &&
+                $(window).scrollTop() + $(window).height() >= link.offset().top) {
+            loadMorePages(link);
+        }
+    });
+});
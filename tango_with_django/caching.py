@@ -0,0 +1,43 @@
+"""Version numbers for groups of cached values, shared by the apps.
+
+Cache keys built with a group's version are invalidated all at once by
+bumping the version, without knowing which keys exist. Each app keeps
+its versions under its own prefix.
+
+The versions, and what is cached with them (rango's category sidebar,
+suggestion index and leaderboards, booktime's catalog), only stay
+current if every process uses the same cache backend: memcached, Redis
+or the database cache. With LocMemCache a change made in one process
+bumps that process's versions only, and the others keep serving stale
+values until they time out.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(prefix, name):
+    return '%s:version:%s' % (prefix, name)
+
+
+def get_version(prefix, name):
+    """Current version of a group of cached values.
+
+    A missing version starts from the current time rather than from 1,
+    so an evicted key can never hand out a version that is still in use.
+    """
+    key = _version_key(prefix, name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(prefix, *names):
+    """Invalidate everything cached under the current version of names."""
+    for name in names:
+        try:
+            cache.incr(_version_key(prefix, name))
+        except ValueError:
+            get_version(prefix, name)